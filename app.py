@@ -3,17 +3,24 @@ Fuel Station Ops — Conversational Analytics
 Chat-like interface: user types question → gets answer + SQL + data table
 """
 
-import streamlit as st
-import pandas as pd
 import time
+from datetime import date
+from functools import partial
+
+_script_start = time.perf_counter()
+
+import streamlit as st
 import uuid
+import db
+import sql_generator
 from sql_generator import generate_sql
-from db import execute_query, log_query, update_feedback
-
-# Approximate cost per token for Claude Sonnet 4 (as of early 2025)
-# Input: $3 per 1M tokens, Output: $15 per 1M tokens
-INPUT_COST_PER_TOKEN = 3.0 / 1_000_000
-OUTPUT_COST_PER_TOKEN = 15.0 / 1_000_000
+from db import execute_query, log_query, update_feedback, fetch_query_sequences, fetch_feedback_pairs
+from prefetch import Prefetcher, build_next_question_model
+from model_router import generate_routed, needs_escalation, STRONG_MODEL
+from prompts import build_prompt
+from verified_answers import build_store, VERIFIED_MODEL
+import usage
+# pandas, result_analytics, result_reuse and render are imported on the first question, not on every rerun
 
 # Page config
 st.set_page_config(
@@ -25,6 +32,31 @@ st.set_page_config(
 st.title("⛽ Fuel Station Ops — Conversational Analytics")
 st.caption("Ask questions about fuel station operations in plain English — powered by NL→SQL")
 
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_prefetch_model():
+    """Next-question model mined from query_logs, refreshed hourly."""
+    return build_next_question_model(fetch_query_sequences())
+
+
+@st.cache_resource(show_spinner=False)
+def get_verified_store():
+    """Verified-answer store shared by all sessions; seeded from query_logs feedback on first use."""
+    return build_store(fetch_feedback_pairs())
+
+
+@st.cache_resource(show_spinner=False)
+def warm_clients():
+    """
+    Build the Supabase + Anthropic clients once per server process.
+    Called after the page has rendered, so client construction stays off first paint.
+    """
+    try:
+        return db.get_client(), sql_generator.get_client()
+    except Exception as e:
+        print(f"Warning: Client warm-up failed: {e}")
+        return None
+
+
 # Initialize session state
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -36,6 +68,11 @@ if "feedback" not in st.session_state:
     st.session_state.feedback = {}
 if "log_ids" not in st.session_state:
     st.session_state.log_ids = {}
+if "result_lineage" not in st.session_state:
+    st.session_state.result_lineage = []
+if "prefetcher" not in st.session_state:
+    st.session_state.prefetcher = Prefetcher(load_prefetch_model, generate_routed, execute_query,
+                                             usage_fn=partial(usage.record_usage, st.session_state.session_id))
 
 # New Conversation button
 if st.sidebar.button("🔄 New Conversation"):
@@ -44,6 +81,10 @@ if st.sidebar.button("🔄 New Conversation"):
     st.session_state.session_id = str(uuid.uuid4())[:8]
     st.session_state.feedback = {}
     st.session_state.log_ids = {}
+    st.session_state.result_lineage = []
+    st.session_state.prefetcher.shutdown()
+    st.session_state.prefetcher = Prefetcher(load_prefetch_model, generate_routed, execute_query,
+                                             usage_fn=partial(usage.record_usage, st.session_state.session_id))
     st.rerun()
 
 # Sidebar with sample questions
@@ -63,11 +104,42 @@ for sq in sample_questions:
         st.session_state.pending_question = sq
         st.rerun()
 
+# Prefetch hit-rate report
+pf = st.session_state.prefetcher.stats()
+if pf["lookups"]:
+    st.sidebar.caption(
+        f"⚡ Prefetch: {pf['hits']}/{pf['lookups']} hits ({pf['hit_rate']:.0%}) · "
+        f"{pf['tokens_spent']:,}/{pf['token_budget']:,} speculative tokens"
+    )
+
+# Usage + budget — session totals from the local usage store, last-hour stats from the
+# incrementally maintained rolling window (no query_logs reads on rerun)
+session_usage = usage.get_totals("session", st.session_state.session_id)
+window = usage.rolling.stats()
+st.sidebar.caption(
+    f"💰 This conversation: ₹{session_usage['cost_inr']:.2f} / ₹{usage.SESSION_BUDGET_INR:.0f} · "
+    f"{session_usage['calls']} LLM calls · {session_usage['cache_hits']} cached"
+)
+if window["calls"] or window["cache_hits"]:
+    st.sidebar.caption(
+        f"🕐 Last hour (all users): {window['calls']} calls · {window['tokens']:,} tokens · "
+        f"₹{window['cost_inr']:.2f} · avg {window['avg_latency_ms']}ms · saved ~₹{window['saved_inr']:.2f}"
+    )
+today_by_model = usage.get_model_breakdown("day", date.today().isoformat())
+if today_by_model:
+    with st.sidebar.expander("📊 Today by model"):
+        for row in today_by_model:
+            st.caption(
+                f"**{row['model']}** — {row['calls']} calls · "
+                f"{row['input_tokens'] + row['output_tokens']:,} tokens · ₹{row['cost_inr']:.2f} · "
+                f"avg {row['avg_latency_ms']}ms"
+            )
+
 # Sidebar footer
 st.sidebar.markdown("---")
 st.sidebar.markdown(
     "<div style='font-size:0.78rem; color:#888;'>"
-    "🤖 Powered by <strong>Claude Sonnet 4</strong><br>"
+    "🤖 Powered by <strong>Claude Haiku 3.5 → Sonnet 4</strong><br>"
     "📦 Data: Supabase (PostgreSQL)<br>"
     "🖥️ Frontend: Streamlit<br><br>"
     "Built by <a href='https://www.linkedin.com/in/sandhya-godavarthy-5072622b/' target='_blank'>Sandhya</a>"
@@ -92,6 +164,7 @@ def render_feedback(msg_index):
             # Persist to DB
             log_id = st.session_state.log_ids.get(msg_index)
             update_feedback(log_id, "up")
+            apply_feedback(msg_index, "up")
             st.rerun()
     with col2:
         if st.button(
@@ -103,12 +176,32 @@ def render_feedback(msg_index):
             # Persist to DB
             log_id = st.session_state.log_ids.get(msg_index)
             update_feedback(log_id, "down")
+            apply_feedback(msg_index, "down")
             st.rerun()
     with col3:
         if current_feedback:
             st.caption("Thanks for the feedback!" if current_feedback == "up" else "Thanks — we'll improve this.")
 
 
+def apply_feedback(msg_index, feedback):
+    """
+    Feed thumbs up/down into the verified-answer store. Only standalone questions whose
+    SQL ran are verified — a follow-up's SQL carries earlier turns' context. Thumbs-down
+    also drops the result from this conversation's reuse lineage so nothing is derived from it.
+    """
+    from result_reuse import forget_result
+
+    msg = st.session_state.messages[msg_index]
+    if not msg.get("sql") or msg_index == 0:
+        return
+    question = st.session_state.messages[msg_index - 1].get("content", "")
+    if feedback == "up" and not (msg.get("standalone") and msg.get("sql_valid")):
+        return
+    get_verified_store().record_feedback(question, msg["sql"], feedback, msg.get("answer", ""), msg.get("assumptions"))
+    if feedback == "down":
+        forget_result(st.session_state.result_lineage, msg["sql"])
+
+
 def render_token_cost(metadata):
     """Show token usage and estimated cost."""
     if not metadata:
@@ -116,8 +209,7 @@ def render_token_cost(metadata):
     input_t = metadata.get("input_tokens", 0)
     output_t = metadata.get("output_tokens", 0)
     latency = metadata.get("llm_latency_ms", 0)
-    cost_usd = (input_t * INPUT_COST_PER_TOKEN) + (output_t * OUTPUT_COST_PER_TOKEN)
-    cost_inr = cost_usd * 86  # approx USD to INR
+    cost_inr = usage.estimate_cost_inr(metadata)
     st.caption(
         f"🔢 Tokens: {input_t} in / {output_t} out &nbsp;|&nbsp; "
         f"💰 ~₹{cost_inr:.4f} &nbsp;|&nbsp; "
@@ -125,6 +217,28 @@ def render_token_cost(metadata):
     )
 
 
+def run_sql(sql: str, prefetched: dict = None) -> dict:
+    """Prefetched result → reuse of an earlier result in this conversation → Supabase."""
+    from result_reuse import execute_with_reuse
+
+    if prefetched and prefetched["result"]:
+        return prefetched["result"]
+    result = execute_with_reuse(sql, st.session_state.result_lineage)
+    if result is None:
+        result = execute_query(sql)
+    return result
+
+
+def last_result_message():
+    """The latest assistant message if it returned a result DataFrame (and wasn't thumbs-downed), else None."""
+    for i in range(len(st.session_state.messages) - 1, -1, -1):
+        msg = st.session_state.messages[i]
+        if msg["role"] == "assistant":
+            usable = msg.get("dataframe") is not None and msg.get("sql") and st.session_state.feedback.get(i) != "down"
+            return msg if usable else None
+    return None
+
+
 # Display chat history
 for i, msg in enumerate(st.session_state.messages):
     with st.chat_message(msg["role"]):
@@ -132,6 +246,8 @@ for i, msg in enumerate(st.session_state.messages):
             st.write(msg["content"])
         else:
             st.write(msg["answer"])
+            if msg.get("narrative"):
+                st.success(msg["narrative"])
             if msg.get("assumptions"):
                 for a in msg["assumptions"]:
                     st.info(f"📌 Assumption: {a}")
@@ -139,17 +255,19 @@ for i, msg in enumerate(st.session_state.messages):
                 with st.expander("🔍 View SQL Query"):
                     st.code(msg["sql"], language="sql")
             if msg.get("dataframe") is not None:
-                with st.expander(f"📊 View Data ({len(msg['dataframe'])} rows)"):
-                    st.dataframe(msg["dataframe"], use_container_width=True)
+                from render import build_render_payload, render_result
+                if msg.get("render") is None:
+                    msg["render"] = build_render_payload(msg["dataframe"])
+                render_result(msg["dataframe"], msg["render"], key=str(i))
             if msg.get("metadata"):
                 render_token_cost(msg["metadata"])
             render_feedback(i)
 
 st.markdown(
     "<div style='text-align:center; font-size:0.72rem; color:#999; padding:2px 0;'>"
-    "⚠️ AI-generated (Claude Sonnet 4) — verify before taking decisions &nbsp;|&nbsp; "
+    "⚠️ AI-generated (Claude) — verify before taking decisions &nbsp;|&nbsp; "
     "Built by <a href='https://www.linkedin.com/in/sandhya-godavarthy-5072622b/' target='_blank' style='color:#f97316;'>Sandhya</a> "
-    "&nbsp;|&nbsp; Powered by Claude Sonnet 4 + Supabase + Streamlit"
+    "&nbsp;|&nbsp; Powered by Claude + Supabase + Streamlit"
     "</div>",
     unsafe_allow_html=True,
 )
@@ -157,11 +275,21 @@ st.markdown(
 # Handle input
 user_input = st.chat_input("Ask a question about fuel station operations...")
 
+# First-render time: script start → page fully drawn, recorded once per session (read by bench_startup.py)
+if "first_render_ms" not in st.session_state:
+    st.session_state.first_render_ms = int((time.perf_counter() - _script_start) * 1000)
+warm_clients()
+
 if "pending_question" in st.session_state:
     user_input = st.session_state.pending_question
     del st.session_state.pending_question
 
 if user_input:
+    import pandas as pd
+    from result_analytics import summarise_result, answer_followup
+    from result_reuse import record_result
+    from render import build_render_payload, render_result
+
     st.session_state.messages.append({"role": "user", "content": user_input})
     with st.chat_message("user"):
         st.write(user_input)
@@ -169,11 +297,133 @@ if user_input:
     start_time = time.time()
 
     with st.chat_message("assistant"):
-        with st.spinner("Analysing your query..."):
-            gen = generate_sql(user_input, st.session_state.conversation_history)
+        msg_index = len(st.session_state.messages)  # index for the assistant message we're about to add
+        standalone = not st.session_state.conversation_history  # asked with no earlier turns as context
+
+        # Trivial follow-ups ("what's the total?") are answered from the previous result — no LLM call
+        prev = last_result_message()
+        local_answer = answer_followup(user_input, prev["dataframe"]) if prev else None
+
+        if local_answer:
+            st.write(local_answer)
+            st.caption("⚡ Answered from the previous result — no new query run")
+            st.session_state.messages.append({"role": "assistant", "answer": local_answer, "assumptions": []})
+
+            elapsed_ms = int((time.time() - start_time) * 1000)
+            log_id = log_query(
+                session_id=st.session_state.session_id,
+                user_question=user_input,
+                generated_sql=None,
+                explanation=local_answer,
+                assumptions=[],
+                rows_returned=len(prev["dataframe"]),
+                execution_time_ms=elapsed_ms,
+                sql_valid=True,
+                error_message=None,
+                metadata={"model": "local"},
+            )
+            st.session_state.log_ids[msg_index] = log_id
+            usage.record_usage(st.session_state.session_id, {"model": "local"}, cached=True)
+            render_feedback(msg_index)
+
+            st.session_state.conversation_history.append({
+                "question": user_input,
+                "sql": prev["sql"],
+                "summary": local_answer,
+            })
+            st.stop()
+
+        # Thumbs-up answers to the same standalone question replay their verified SQL. Verified pairs
+        # were asked with no context, so they're only served to questions asked the same way.
+        verified_store = get_verified_store()
+        verified = verified_store.lookup(user_input) if standalone else None
+
+        # Likely follow-ups were generated + executed in the background after the previous answer
+        prefetched = None if verified else st.session_state.prefetcher.lookup(user_input, st.session_state.conversation_history)
+        if prefetched and verified_store.is_quarantined(prefetched["gen"]["sql"]):
+            prefetched = None
+
+        if verified:
+            gen = {
+                "sql": verified["sql"],
+                "explanation": verified["explanation"],
+                "assumptions": verified["assumptions"],
+                "error": None,
+                "metadata": {"model": VERIFIED_MODEL, "verified_match": verified["question"],
+                             "request_messages": build_prompt(user_input)},
+            }
+            st.caption(f"✅ Verified answer — matches a previously approved question: “{verified['question']}”")
+        elif prefetched:
+            gen = prefetched["gen"]
+        else:
+            # Over budget: cached paths above still work, anything needing a new LLM call is refused
+            budget = usage.check_budget(st.session_state.session_id)
+            if not budget["ok"]:
+                answer = f"⚠️ Sorry — {budget['reason']}. Follow-ups on results already shown can still be answered."
+                st.warning(answer)
+                st.session_state.messages.append({"role": "assistant", "answer": answer, "assumptions": []})
+                log_query(
+                    session_id=st.session_state.session_id,
+                    user_question=user_input,
+                    generated_sql=None,
+                    explanation=None,
+                    assumptions=[],
+                    rows_returned=0,
+                    execution_time_ms=int((time.time() - start_time) * 1000),
+                    sql_valid=False,
+                    error_message="Budget exceeded",
+                )
+                st.stop()
+
+            # Easy questions go to the fast model first; hard ones straight to Sonnet
+            with st.spinner("Analysing your query..."):
+                gen = generate_routed(user_input, st.session_state.conversation_history)
+
+        # Run the query before rendering so a failed fast-tier / verified answer can be escalated
+        result = None
+        if not gen["error"] and gen["sql"]:
+            with st.spinner("Running query..."):
+                result = run_sql(gen["sql"], prefetched)
+
+        served_prefetch = prefetched is not None and gen is prefetched["gen"]
+        escalation_reason = needs_escalation(gen, result, user_input)
+        if escalation_reason and not usage.check_budget(st.session_state.session_id)["ok"]:
+            # Over budget: show the failed answer rather than paying for a Sonnet retry
+            st.caption("⚠️ Usage budget reached — not retrying with a stronger model")
+            escalation_reason = ""
+        if escalation_reason:
+            # Log the failed attempt on its own so query_logs.model shows per-tier accuracy
+            failed_meta = gen["metadata"]
+            log_query(
+                session_id=st.session_state.session_id,
+                user_question=user_input,
+                generated_sql=gen["sql"],
+                explanation=gen["explanation"],
+                assumptions=gen.get("assumptions", []),
+                rows_returned=0,
+                execution_time_ms=int((time.time() - start_time) * 1000),
+                sql_valid=False,
+                error_message=escalation_reason,
+                metadata=failed_meta,
+            )
+            if not served_prefetch:
+                usage.record_usage(st.session_state.session_id, failed_meta)
+
+            with st.spinner("Retrying with a stronger model..."):
+                gen = generate_sql(user_input, st.session_state.conversation_history, model=STRONG_MODEL)
+            gen["metadata"]["routing_tier"] = "strong"
+            gen["metadata"]["escalated_from"] = failed_meta["model"]
+            served_prefetch = False
+            result = None
+            if not gen["error"] and gen["sql"]:
+                with st.spinner("Running query..."):
+                    result = run_sql(gen["sql"])
 
         meta = gen.get("metadata", {})
-        msg_index = len(st.session_state.messages)  # index for the assistant message we're about to add
+        if served_prefetch:
+            meta["prefetched"] = True  # its LLM call was recorded by the prefetcher when it was made
+        else:
+            usage.record_usage(st.session_state.session_id, meta, cached=meta.get("model") == VERIFIED_MODEL)
 
         if gen["error"]:
             answer = f"❌ Error generating SQL: {gen['error']}"
@@ -229,10 +479,9 @@ if user_input:
             with st.expander("🔍 View SQL Query"):
                 st.code(gen["sql"], language="sql")
 
-            with st.spinner("Running query..."):
-                result = execute_query(gen["sql"])
-
             df = None
+            analysis = None
+            payload = None
             sql_valid = True
             error_msg = None
             rows_returned = 0
@@ -248,8 +497,13 @@ if user_input:
             else:
                 df = pd.DataFrame(result["data"])
                 rows_returned = len(df)
-                with st.expander(f"📊 View Data ({len(df)} rows)"):
-                    st.dataframe(df, use_container_width=True)
+                record_result(st.session_state.result_lineage, gen["sql"], df, parent=result.get("reused_from"))
+                if result.get("reused_from") is not None:
+                    st.caption("♻️ Computed from an earlier result in this conversation — no database query needed")
+                analysis = summarise_result(df)
+                st.success(analysis["narrative"])
+                payload = build_render_payload(df)
+                render_result(df, payload, key=str(msg_index))
                 answer = gen["explanation"]
 
             elapsed_ms = int((time.time() - start_time) * 1000)
@@ -273,17 +527,23 @@ if user_input:
                 "sql": gen["sql"],
                 "assumptions": gen.get("assumptions", []),
                 "dataframe": df,
+                "narrative": analysis["narrative"] if analysis else None,
+                "render": payload,
                 "metadata": meta,
+                "standalone": standalone,
+                "sql_valid": sql_valid,
             })
 
             render_token_cost(meta)
             render_feedback(msg_index)
 
-            summary = ""
-            if df is not None:
-                summary = f"{len(df)} rows returned. Columns: {list(df.columns)}. First row: {df.iloc[0].to_dict()}" if len(df) > 0 else "Empty result"
+            summary = analysis["summary"] if analysis else ""
             st.session_state.conversation_history.append({
                 "question": user_input,
                 "sql": gen["sql"],
                 "summary": summary,
             })
+
+            # Warm the cache with likely follow-ups while the user reads this answer (never past the budget)
+            if df is not None and usage.check_budget(st.session_state.session_id)["ok"]:
+                st.session_state.prefetcher.schedule(user_input, st.session_state.conversation_history)
@@ -0,0 +1,97 @@
+"""
+Startup benchmark: import-time profile + first-render time for the Streamlit app.
+Runs each module import in a fresh interpreter with `-X importtime`, reports the
+slowest imports, then renders app.py headlessly (streamlit.testing) to time first paint.
+
+Usage: python bench_startup.py [--top 15]
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+APP_MODULES = ["prompts", "db", "sql_generator", "llm_response", "prefetch", "model_router", "verified_answers",
+               "usage", "result_analytics", "result_reuse", "render"]
+HEAVY_DEPS = ["streamlit", "pandas", "anthropic", "supabase"]
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_import(module: str) -> dict:
+    """
+    Import `module` in a clean interpreter with -X importtime.
+    Returns {"module", "total_ms", "entries": [(cumulative_us, self_us, name)], "error"}.
+    """
+    env = {k: v for k, v in os.environ.items() if k not in ("SUPABASE_URL", "SUPABASE_KEY", "ANTHROPIC_API_KEY")}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+    )
+    entries = []
+    for line in proc.stderr.splitlines():
+        m = _IMPORTTIME_LINE.match(line)
+        if m:
+            entries.append((int(m.group(2)), int(m.group(1)), m.group(4)))
+    top_level = next((e for e in reversed(entries) if e[2] == module), None)
+    error = None
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"
+    return {
+        "module": module,
+        "total_ms": round(top_level[0] / 1000, 1) if top_level else None,
+        "entries": entries,
+        "error": error,
+    }
+
+
+def measure_first_render(timeout: int = 60) -> dict:
+    """Render app.py once headlessly and read back the app's own first_render_ms metric."""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {"wall_ms": None, "first_render_ms": None, "error": "streamlit not installed"}
+
+    start = time.perf_counter()
+    at = AppTest.from_file("app.py", default_timeout=timeout).run()
+    wall_ms = int((time.perf_counter() - start) * 1000)
+    return {
+        "wall_ms": wall_ms,
+        "first_render_ms": at.session_state["first_render_ms"] if "first_render_ms" in at.session_state else None,
+        "error": str(at.exception[0].message) if at.exception else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list per module")
+    args = parser.parse_args()
+
+    print(f"{'='*60}\nImport time (fresh interpreter, -X importtime)\n{'='*60}")
+    for module in APP_MODULES + HEAVY_DEPS:
+        prof = profile_import(module)
+        if prof["error"]:
+            print(f"  {module:<20} ❌ {prof['error']}")
+            continue
+        print(f"  {module:<20} {prof['total_ms']:>8} ms")
+
+    print(f"\n{'='*60}\nSlowest imports pulled in by the app modules\n{'='*60}")
+    seen = {}
+    for module in APP_MODULES:
+        for cumulative, _self, name in profile_import(module)["entries"]:
+            seen[name] = max(seen.get(name, 0), cumulative)
+    for name, us in sorted(seen.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"  {us / 1000:>8.1f} ms  {name}")
+
+    print(f"\n{'='*60}\nFirst render (app.py, headless)\n{'='*60}")
+    fr = measure_first_render()
+    if fr["error"]:
+        print(f"  ⚠️  {fr['error']}")
+    print(f"  first_render_ms (in-app): {fr['first_render_ms']}")
+    print(f"  wall time incl. harness:  {fr['wall_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,23 @@ Supabase connection + raw SQL execution + comprehensive query logging.
 
 import os
 import json
-from dotenv import load_dotenv
-from supabase import create_client
 
-load_dotenv()
+_supabase = None
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+def get_client():
+    """
+    Supabase client, built on first use so importing this module needs no credentials.
+    supabase and python-dotenv are imported here to keep module import cheap.
+    """
+    global _supabase
+    if _supabase is None:
+        from dotenv import load_dotenv
+        from supabase import create_client
+
+        load_dotenv()
+        _supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+    return _supabase
 
 
 def execute_query(sql: str) -> dict:
@@ -26,7 +34,7 @@ def execute_query(sql: str) -> dict:
         return {"data": None, "error": "Only SELECT queries are allowed."}
 
     try:
-        result = supabase.rpc("execute_sql", {"query_text": sql}).execute()
+        result = get_client().rpc("execute_sql", {"query_text": sql}).execute()
         return {"data": result.data, "error": None}
     except Exception as e:
         return {"data": None, "error": str(e)}
@@ -65,7 +73,7 @@ def log_query(session_id: str, user_question: str, generated_sql: str,
             row["llm_latency_ms"] = metadata.get("llm_latency_ms", 0)
             row["stop_reason"] = metadata.get("stop_reason")
 
-        result = supabase.table("query_logs").insert(row).execute()
+        result = get_client().table("query_logs").insert(row).execute()
         # Return the ID of the inserted row
         if result.data and len(result.data) > 0:
             return result.data[0].get("id")
@@ -83,8 +91,63 @@ def update_feedback(log_id: int, feedback: str):
     if not log_id:
         return
     try:
-        supabase.table("query_logs").update(
+        get_client().table("query_logs").update(
             {"user_feedback": feedback}
         ).eq("id", log_id).execute()
     except Exception as e:
         print(f"Warning: Feedback update failed: {e}")
+
+
+def fetch_query_sequences(limit: int = 5000) -> list:
+    """
+    Fetch recent (session_id, user_question) rows from query_logs in insertion order.
+    Used to mine next-question patterns for prefetching. Returns [] on failure.
+    """
+    try:
+        result = (
+            get_client().table("query_logs")
+            .select("id, session_id, user_question")
+            .order("id", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        return list(reversed(result.data or []))
+    except Exception as e:
+        print(f"Warning: Fetching query sequences failed: {e}")
+        return []
+
+
+def _is_standalone(request_messages) -> bool:
+    """True if a logged request carried no conversation context (one message, no history block)."""
+    try:
+        messages = json.loads(request_messages) if isinstance(request_messages, str) else request_messages
+    except json.JSONDecodeError:
+        return False
+    return (isinstance(messages, list) and len(messages) == 1
+            and "--- CONVERSATION CONTEXT ---" not in str(messages[0].get("content", "")))
+
+
+def fetch_feedback_pairs(limit: int = 5000) -> list:
+    """
+    Fetch query_logs rows that received thumbs up/down and have SQL attached,
+    oldest first (so later feedback wins). Each row gets a "standalone" flag derived
+    from its logged request_messages. Returns [] on failure.
+    """
+    try:
+        result = (
+            get_client().table("query_logs")
+            .select("id, user_question, generated_sql, explanation, assumptions, user_feedback, sql_valid, "
+                    "request_messages")
+            .not_.is_("user_feedback", "null")
+            .not_.is_("generated_sql", "null")
+            .order("id", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        rows = list(reversed(result.data or []))
+        for row in rows:
+            row["standalone"] = _is_standalone(row.pop("request_messages", None))
+        return rows
+    except Exception as e:
+        print(f"Warning: Fetching feedback pairs failed: {e}")
+        return []
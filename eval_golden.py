@@ -0,0 +1,394 @@
+"""
+Offline accuracy + latency regression suite for the NL→SQL generator.
+Each golden question has a reference SQL. Both the reference and the generated SQL
+run against a local SQLite copy of the seeded dataset (generate_data.py, seed 42),
+and the result sets are compared with numeric tolerance.
+
+Claude is replayed from golden/recordings.json, so the suite runs offline and
+deterministically. Use --record to call the live API and refresh the recordings
+after a prompt / model / routing change.
+
+Until real recordings exist, replay falls back to golden/recordings_synthetic.json:
+HAND-WRITTEN fixtures (answers adapted from the prompt's few-shot examples, made-up
+token counts and latencies) that only exercise the harness — routing, escalation,
+SQLite shims and result comparison. Match rates and latencies from them say nothing
+about the real generator; the run is labelled "synthetic" in the output and report.
+
+Usage: python eval_golden.py [--record] [--only ID] [--min-match 0.8] [--report out.json]
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import sqlite3
+import argparse
+from types import SimpleNamespace
+from datetime import date
+
+import sql_generator
+from sql_generator import generate_sql, MODEL as STRONG_MODEL
+from model_router import route_question, needs_escalation
+from generate_data import STATIONS, generate_all_rows
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+GOLDEN_SET_PATH = os.path.join(GOLDEN_DIR, "golden_set.json")
+RECORDINGS_PATH = os.path.join(GOLDEN_DIR, "recordings.json")
+SYNTHETIC_RECORDINGS_PATH = os.path.join(GOLDEN_DIR, "recordings_synthetic.json")
+
+REL_TOL = 1e-4
+ABS_TOL = 0.01
+
+# fuel_stations attributes aren't in generate_data.py — derived from the station_id state code
+STATE_INFO = {
+    "MH": ("Maharashtra", "Mumbai", "West"),
+    "GJ": ("Gujarat", "Ahmedabad", "West"),
+    "DL": ("Delhi", "New Delhi", "North"),
+    "RJ": ("Rajasthan", "Jaipur", "North"),
+    "UP": ("Uttar Pradesh", "Lucknow", "North"),
+    "KA": ("Karnataka", "Bengaluru", "South"),
+    "TN": ("Tamil Nadu", "Chennai", "South"),
+    "TS": ("Telangana", "Hyderabad", "South"),
+    "WB": ("West Bengal", "Kolkata", "East"),
+    "OD": ("Odisha", "Bhubaneswar", "East"),
+    "BR": ("Bihar", "Patna", "East"),
+}
+
+
+# ------------------------------------------------------------------
+# Local dataset
+# ------------------------------------------------------------------
+
+def _date_trunc(unit, value):
+    if value is None:
+        return None
+    d = date.fromisoformat(str(value)[:10])
+    unit = unit.lower()
+    if unit == "month":
+        d = d.replace(day=1)
+    elif unit == "quarter":
+        d = d.replace(month=3 * ((d.month - 1) // 3) + 1, day=1)
+    elif unit == "year":
+        d = d.replace(month=1, day=1)
+    return d.isoformat()
+
+
+def _to_char(value, fmt):
+    if value is None:
+        return None
+    d = date.fromisoformat(str(value)[:10])
+    out = fmt
+    for token, repl in (("YYYY", f"{d.year:04d}"), ("Month", d.strftime("%B")), ("Mon", d.strftime("%b")),
+                        ("MM", f"{d.month:02d}"), ("DD", f"{d.day:02d}")):
+        out = out.replace(token, repl)
+    return out
+
+
+_STRFTIME = {"MONTH": "%m", "YEAR": "%Y", "DAY": "%d"}
+
+
+def to_sqlite(sql: str) -> str:
+    """Rewrite the PostgreSQL-isms the generator commonly emits into SQLite equivalents."""
+    sql = re.sub(r"::\s*\w+(\s*\(\s*\d+(\s*,\s*\d+)?\s*\))?", "", sql)
+    sql = re.sub(r"\bILIKE\b", "LIKE", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bEXTRACT\s*\(\s*(MONTH|YEAR|DAY)\s+FROM\s+([^)]+)\)",
+                 lambda m: f"CAST(strftime('{_STRFTIME[m.group(1).upper()]}', {m.group(2)}) AS INTEGER)",
+                 sql, flags=re.IGNORECASE)
+    return sql
+
+
+def build_local_db(seed: int = 42) -> sqlite3.Connection:
+    """In-memory SQLite with fuel_stations + daily_operations rebuilt from generate_data.py."""
+    conn = sqlite3.connect(":memory:")
+    conn.create_function("DATE_TRUNC", 2, _date_trunc, deterministic=True)
+    conn.create_function("TO_CHAR", 2, _to_char, deterministic=True)
+    conn.executescript("""
+        CREATE TABLE fuel_stations (
+            station_id TEXT PRIMARY KEY, station_name TEXT, city TEXT, state TEXT, region TEXT,
+            station_type TEXT, has_ev_charging BOOLEAN, storage_capacity_kl NUMERIC, status TEXT
+        );
+        CREATE TABLE daily_operations (
+            id INTEGER PRIMARY KEY, station_id TEXT, operation_date TEXT, fuel_type TEXT,
+            volume_sold_liters NUMERIC, revenue_inr NUMERIC, footfall INTEGER, safety_incidents INTEGER,
+            ev_charging_sessions INTEGER, stock_received_liters NUMERIC, closing_stock_liters NUMERIC,
+            dispenser_downtime_hours NUMERIC, operating_hours NUMERIC,
+            UNIQUE (station_id, operation_date, fuel_type)
+        );
+    """)
+    for sid, stype, has_ev, cap, status in STATIONS:
+        state, city, region = STATE_INFO[sid.split("-")[1]]
+        conn.execute("INSERT INTO fuel_stations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (sid, f"Jbp {city} {stype} {sid[-3:]}", city, state, region, stype, has_ev, cap, status))
+    rows = generate_all_rows(seed)
+    cols = list(rows[0].keys())
+    conn.executemany(
+        f"INSERT INTO daily_operations ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+        [tuple(r[c] for c in cols) for r in rows],
+    )
+    conn.commit()
+    return conn
+
+
+def run_local(conn: sqlite3.Connection, sql: str) -> dict:
+    """Execute on the local dataset. Returns {"rows", "columns", "error", "exec_ms"}."""
+    start = time.perf_counter()
+    try:
+        cur = conn.execute(to_sqlite(sql))
+        rows = cur.fetchall()
+        columns = [d[0] for d in cur.description]
+        return {"rows": rows, "columns": columns, "error": None,
+                "exec_ms": round((time.perf_counter() - start) * 1000, 1)}
+    except Exception as e:
+        return {"rows": None, "columns": None, "error": str(e), "exec_ms": None}
+
+
+# ------------------------------------------------------------------
+# Result comparison
+# ------------------------------------------------------------------
+
+def _values_match(a, b) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return math.isclose(float(a), float(b), rel_tol=REL_TOL, abs_tol=ABS_TOL)
+    return str(a) == str(b)
+
+
+def _sort_key(v):
+    return (0, float(v), "") if isinstance(v, (int, float)) else (1, 0.0, str(v))
+
+
+def results_match(reference: list, generated: list, ordered: bool = False) -> bool:
+    """
+    Execution match with tolerance. Column names are ignored; extra generated
+    columns are allowed as long as every reference column is matched by a distinct
+    generated column. Row order only matters when ordered=True.
+    """
+    if len(reference) != len(generated):
+        return False
+    if not reference:
+        return True
+    ref_cols = list(zip(*reference))
+    gen_cols = list(zip(*generated))
+
+    mapping, used = [], set()
+    for rc in ref_cols:
+        rc_cmp = rc if ordered else sorted(rc, key=_sort_key)
+        for k, gc in enumerate(gen_cols):
+            if k in used:
+                continue
+            gc_cmp = gc if ordered else sorted(gc, key=_sort_key)
+            if all(_values_match(a, b) for a, b in zip(rc_cmp, gc_cmp)):
+                mapping.append(k)
+                used.add(k)
+                break
+        else:
+            return False
+
+    # Columns match individually — check they also line up row by row
+    projected = [tuple(row[k] for k in mapping) for row in generated]
+    ref_rows, gen_rows = list(reference), projected
+    if not ordered:
+        ref_rows = sorted(ref_rows, key=lambda r: [_sort_key(v) for v in r])
+        gen_rows = sorted(gen_rows, key=lambda r: [_sort_key(v) for v in r])
+    return all(_values_match(a, b) for r, g in zip(ref_rows, gen_rows) for a, b in zip(r, g))
+
+
+# ------------------------------------------------------------------
+# Record / replay
+# ------------------------------------------------------------------
+
+def _recording_key(model: str, messages: list) -> str:
+    return f"{model}::{messages[-1]['content']}"
+
+
+class ReplayClient:
+    """Stands in for the Anthropic client, answering messages.create() from recordings."""
+
+    def __init__(self, recordings: dict):
+        self.recordings = recordings
+        self.messages = self
+
+    def create(self, **request):
+        key = _recording_key(request["model"], request["messages"])
+        rec = self.recordings.get(key)
+        if rec is None:
+            raise KeyError(f"No recording for {key!r} — run with --record")
+        return SimpleNamespace(
+            content=[SimpleNamespace(**block) for block in rec["content"]],
+            usage=SimpleNamespace(**rec["usage"]),
+            stop_reason=rec["stop_reason"],
+            recorded_latency_ms=rec.get("latency_ms", 0),
+        )
+
+
+class RecordingClient:
+    """Wraps the live client and captures every response for later replay."""
+
+    def __init__(self, live_client, recordings: dict):
+        self.live = live_client
+        self.recordings = recordings
+        self.messages = self
+
+    def create(self, **request):
+        start = time.time()
+        response = self.live.messages.create(**request)
+        content = []
+        for block in response.content:
+            if block.type == "tool_use":
+                content.append({"type": "tool_use", "name": block.name, "input": block.input})
+            elif block.type == "text":
+                content.append({"type": "text", "text": block.text})
+        self.recordings[_recording_key(request["model"], request["messages"])] = {
+            "content": content,
+            "usage": {"input_tokens": response.usage.input_tokens, "output_tokens": response.usage.output_tokens},
+            "stop_reason": response.stop_reason,
+            "latency_ms": int((time.time() - start) * 1000),
+        }
+        return response
+
+
+# ------------------------------------------------------------------
+# Suite
+# ------------------------------------------------------------------
+
+def evaluate_case(case: dict, conn: sqlite3.Connection, recordings: dict, record: bool) -> dict:
+    """Generate SQL the way app.py does (routing + escalation), execute, and compare."""
+    question = case["question"]
+    route = route_question(question)
+    attempts = []
+
+    gen = generate_sql(question, model=route["model"])
+    attempts.append(gen)
+    generated = run_local(conn, gen["sql"]) if not gen["error"] and gen["sql"] else None
+    if needs_escalation(gen, {"error": generated["error"]} if generated else None, question):
+        gen = generate_sql(question, model=STRONG_MODEL)
+        attempts.append(gen)
+        generated = run_local(conn, gen["sql"]) if not gen["error"] and gen["sql"] else None
+
+    llm_latency = 0
+    for a in attempts:
+        meta = a["metadata"]
+        if record:
+            llm_latency += meta["llm_latency_ms"]
+        else:
+            rec = recordings.get(_recording_key(meta["model"], meta["request_messages"]), {})
+            llm_latency += rec.get("latency_ms", 0)
+
+    reference_sql = case.get("reference_sql")
+    if reference_sql is None:
+        # Unanswerable question — correct behaviour is sql = null
+        matched = not gen["error"] and gen["sql"] is None
+        error = gen["error"] or (None if matched else "Expected sql=null")
+    else:
+        reference = run_local(conn, reference_sql)
+        if reference["error"]:
+            raise RuntimeError(f"Reference SQL for {case['id']} fails locally: {reference['error']}")
+        error = gen["error"] or (generated["error"] if generated else "No SQL generated")
+        matched = error is None and results_match(reference["rows"], generated["rows"], case.get("ordered", False))
+
+    return {
+        "id": case["id"],
+        "question": question,
+        "tier": route["tier"],
+        "model": gen["metadata"]["model"],
+        "escalated": len(attempts) > 1,
+        "matched": matched,
+        "error": error,
+        "llm_latency_ms": llm_latency,
+        "exec_ms": generated["exec_ms"] if generated else None,
+        "tokens": sum(a["metadata"]["total_tokens"] for a in attempts),
+        "parse_mode": gen["metadata"].get("parse_mode"),
+        "generated_sql": gen["sql"],
+    }
+
+
+def _percentile(values: list, pct: float):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def summarise(results: list) -> dict:
+    latencies = [r["llm_latency_ms"] for r in results]
+    matched = sum(r["matched"] for r in results)
+    return {
+        "cases": len(results),
+        "matched": matched,
+        "execution_match_rate": matched / len(results) if results else 0.0,
+        "escalations": sum(r["escalated"] for r in results),
+        "llm_latency_p50_ms": _percentile(latencies, 50),
+        "llm_latency_p95_ms": _percentile(latencies, 95),
+        "total_tokens": sum(r["tokens"] for r in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden-set accuracy + latency regression suite")
+    parser.add_argument("--record", action="store_true", help="call the live API and refresh recordings")
+    parser.add_argument("--only", action="append", help="run only these case ids")
+    parser.add_argument("--min-match", type=float, default=0.0, help="exit non-zero below this match rate")
+    parser.add_argument("--report", help="write per-case results + summary as JSON")
+    args = parser.parse_args()
+
+    with open(GOLDEN_SET_PATH) as f:
+        cases = json.load(f)
+    if args.only:
+        cases = [c for c in cases if c["id"] in args.only]
+    recordings = {}
+    synthetic = False
+    if os.path.exists(RECORDINGS_PATH):
+        with open(RECORDINGS_PATH) as f:
+            recordings = json.load(f)
+    elif not args.record:
+        with open(SYNTHETIC_RECORDINGS_PATH) as f:
+            recordings = json.load(f)
+        synthetic = True
+        print("⚠️  No recordings.json — replaying SYNTHETIC hand-written fixtures. This checks the harness only;\n"
+              "   run with --record for a real accuracy / latency measurement.\n")
+
+    if args.record:
+        sql_generator.set_client(RecordingClient(sql_generator.get_client(), recordings))
+    else:
+        sql_generator.set_client(ReplayClient(recordings))
+
+    conn = build_local_db()
+    results = []
+    for case in cases:
+        r = evaluate_case(case, conn, recordings, args.record)
+        results.append(r)
+        status = "✅" if r["matched"] else "❌"
+        esc = " ↑escalated" if r["escalated"] else ""
+        exec_ms = f"{r['exec_ms']}ms" if r["exec_ms"] is not None else "n/a"
+        print(f"{status} {r['id']:<30} [{r['tier']}{esc}] llm {r['llm_latency_ms']}ms · "
+              f"exec {exec_ms} · {r['tokens']} tokens")
+        if r["error"]:
+            print(f"   ↳ {r['error']}")
+
+    summary = summarise(results)
+    summary["synthetic"] = synthetic
+    print(f"\n{'='*60}")
+    if synthetic:
+        print("SYNTHETIC FIXTURES — not a measurement of the real generator")
+    print(f"Execution match: {summary['matched']}/{summary['cases']} ({summary['execution_match_rate']:.0%})")
+    print(f"Escalations:     {summary['escalations']}")
+    print(f"LLM latency:     p50 {summary['llm_latency_p50_ms']}ms · p95 {summary['llm_latency_p95_ms']}ms")
+    print(f"Tokens:          {summary['total_tokens']:,}")
+
+    if args.record:
+        with open(RECORDINGS_PATH, "w") as f:
+            json.dump(recordings, f, indent=2, sort_keys=True, ensure_ascii=False)
+            f.write("\n")
+        print(f"Recordings saved to {RECORDINGS_PATH}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=2)
+
+    sys.exit(0 if summary["execution_match_rate"] >= args.min_match else 1)
+
+
+if __name__ == "__main__":
+    main()
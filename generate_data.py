@@ -7,15 +7,7 @@ Inserts directly into Supabase via REST API.
 import random
 import json
 from datetime import date, timedelta
-from supabase import create_client
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+from collections import Counter
 
 random.seed(42)  # reproducible data
 
@@ -178,12 +170,25 @@ def generate_station_data(station_id, station_type, has_ev, storage_kl, status):
     return rows
 
 
-def main():
+def generate_all_rows(seed: int = 42) -> list:
+    """
+    All daily_operations rows for every station — exactly what main() inserts.
+    Re-seeds first, so the local eval dataset is identical to what was loaded into Supabase.
+    """
+    random.seed(seed)
     all_rows = []
     for sid, stype, has_ev, cap, status in STATIONS:
-        station_rows = generate_station_data(sid, stype, has_ev, cap, status)
-        all_rows.extend(station_rows)
-        print(f"  {sid}: {len(station_rows)} rows")
+        all_rows.extend(generate_station_data(sid, stype, has_ev, cap, status))
+    return all_rows
+
+
+def main():
+    from db import get_client
+
+    supabase = get_client()
+    all_rows = generate_all_rows()
+    for sid, n in Counter(r["station_id"] for r in all_rows).items():
+        print(f"  {sid}: {n} rows")
 
     print(f"\nTotal rows to insert: {len(all_rows)}")
 
@@ -0,0 +1,203 @@
+"""
+Claude response handling for the NL→SQL generator.
+Structured mode: Claude is forced to call a tool whose JSON schema is
+{sql, explanation, assumptions}, so the answer arrives as a parsed dict.
+Legacy mode: a tolerant single-pass parser for text responses that repairs
+common breakage locally (code fences, trailing commas, raw newlines in strings,
+Python literals, truncated output) instead of re-asking the model.
+"""
+
+import json
+import threading
+
+SQL_TOOL = {
+    "name": "submit_sql_answer",
+    "description": "Return the SQL query that answers the user's question, or sql=null if it cannot be answered.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "sql": {
+                "type": ["string", "null"],
+                "description": "A single PostgreSQL SELECT query, or null if the question can't be answered.",
+            },
+            "explanation": {
+                "type": "string",
+                "description": "One-line plain English explanation of what the query does (or why it can't be answered).",
+            },
+            "assumptions": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Assumptions made to interpret the question.",
+            },
+        },
+        "required": ["sql", "explanation", "assumptions"],
+    },
+}
+TOOL_CHOICE = {"type": "tool", "name": SQL_TOOL["name"]}
+
+_decoder = json.JSONDecoder(strict=False)  # strict=False accepts raw newlines inside strings
+_LITERALS = {"None": "null", "True": "true", "False": "false", "null": "null", "true": "true", "false": "false"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+# Process-wide parse counters, reported in metadata as a running failure rate
+_stats_lock = threading.Lock()
+PARSE_STATS = {"responses": 0, "tool": 0, "json": 0, "repaired": 0, "failed": 0}
+
+
+def _record(mode: str):
+    with _stats_lock:
+        PARSE_STATS["responses"] += 1
+        PARSE_STATS[mode] += 1
+
+
+def parse_failure_rate() -> float:
+    """Share of responses that could not be parsed into {sql, explanation, assumptions}."""
+    with _stats_lock:
+        total = PARSE_STATS["responses"]
+        return PARSE_STATS["failed"] / total if total else 0.0
+
+
+def _normalise(obj: dict) -> dict:
+    """Coerce a parsed object into the generator's {sql, explanation, assumptions} shape."""
+    sql = obj.get("sql")
+    if not isinstance(sql, str) or not sql.strip() or sql.strip().lower() == "null":
+        sql = None
+    assumptions = obj.get("assumptions") or []
+    if isinstance(assumptions, str):
+        assumptions = [assumptions]
+    return {
+        "sql": sql.strip() if sql else None,
+        "explanation": str(obj.get("explanation") or ""),
+        "assumptions": [str(a) for a in assumptions],
+    }
+
+
+def repair_json(text: str):
+    """
+    Single pass over the text from the first '{': drops trailing commas, maps Python
+    literals to JSON, and closes an unterminated string / open brackets if the
+    response was cut off. Stops at the end of the first top-level object.
+    Returns the parsed dict, or None if it still isn't valid JSON — or if it was cut
+    off before the "sql" value was complete (closing "... LIMIT 1" of a truncated
+    "LIMIT 10" would run a different query).
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    out, stack = [], []
+    in_string = escaped = False
+    string_start, last_string, open_key = 0, None, None  # open_key = top-level key whose value is being read
+    i, n = start, len(text)
+    while i < n:
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+                last_string = "".join(out[string_start + 1:-1])
+                if len(stack) == 1 and open_key is not None:
+                    open_key = None
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+            string_start = len(out)
+        elif ch == ":" and len(stack) == 1:
+            open_key = last_string
+        elif ch == "," and len(stack) == 1:
+            open_key = None
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+        elif ch in "}]":
+            # Drop a trailing comma before the closer
+            while out and out[-1] in " \t\r\n":
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack:
+                stack.pop()
+            if len(stack) == 1:
+                open_key = None  # a nested value (e.g. the assumptions list) just closed
+            out.append(ch)
+            if not stack:
+                break
+            i += 1
+            continue
+        elif ch.isalpha() and not (out and (out[-1].isdigit() or out[-1] == ".")):
+            j = i
+            while j < n and text[j].isalnum():
+                j += 1
+            word = text[i:j]
+            out.append(_LITERALS.get(word, '"' + word + '"'))
+            i = j
+            continue
+        out.append(ch)
+        i += 1
+
+    truncated = in_string or bool(stack)
+    if truncated and open_key == "sql":
+        return None
+    if in_string:
+        out.append('"')
+    while out and out[-1] in " \t\r\n,":
+        out.pop()
+    out.extend(reversed(stack))
+
+    try:
+        obj = _decoder.decode("".join(out))
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(obj, dict) or (truncated and "sql" not in obj):
+        return None
+    return obj
+
+
+def parse_text(raw_text: str) -> dict:
+    """
+    Parse a legacy text response. Returns the normalised answer plus
+    "parse_mode" ("json" | "repaired" | "failed").
+    """
+    start = raw_text.find("{")
+    if start != -1:
+        # Fast path: decode in place from the first brace — no fence splitting or slicing
+        try:
+            obj, _ = _decoder.raw_decode(raw_text, start)
+            if isinstance(obj, dict):
+                _record("json")
+                return {**_normalise(obj), "parse_mode": "json"}
+        except json.JSONDecodeError:
+            pass
+
+        obj = repair_json(raw_text)
+        if obj is not None:
+            _record("repaired")
+            return {**_normalise(obj), "parse_mode": "repaired"}
+
+    # Claude answered conversationally — surface the text as a non-SQL answer
+    _record("failed")
+    return {"sql": None, "explanation": raw_text.strip(), "assumptions": [], "parse_mode": "failed"}
+
+
+def parse_response(response) -> dict:
+    """
+    Parse an Anthropic Messages response (tool_use or text).
+    Returns {"sql", "explanation", "assumptions", "parse_mode", "raw_text"}.
+    """
+    texts = []
+    for block in response.content:
+        block_type = getattr(block, "type", None)
+        if block_type == "tool_use" and block.name == SQL_TOOL["name"]:
+            tool_input = block.input if isinstance(block.input, dict) else {}
+            _record("tool")
+            return {**_normalise(tool_input), "parse_mode": "tool", "raw_text": json.dumps(tool_input)}
+        if block_type == "text":
+            texts.append(block.text)
+
+    raw_text = "".join(texts).strip()
+    return {**parse_text(raw_text), "raw_text": raw_text}
@@ -0,0 +1,110 @@
+"""
+Model routing: simple questions go to a fast, cheap model; complex ones (and
+anything the fast model gets wrong) go to Sonnet.
+Complexity is scored locally from the question text — no extra LLM call.
+"""
+
+import re
+from sql_generator import MODEL as STRONG_MODEL, generate_sql
+
+FAST_MODEL = "claude-3-5-haiku-20241022"
+
+# Questions scoring at or above this go straight to the strong model
+ESCALATE_SCORE = 3
+
+# (weight, reason, pattern) — each signal counts once
+COMPLEXITY_SIGNALS = [
+    # Prompt rules 6–7: footfall / safety / EV are per station-day and need deduplication
+    (3, "needs station-day dedup (footfall)", r"\b(footfall|visits?|customers?)\b"),
+    (3, "needs station-day dedup (safety/EV)", r"\b(safety|incidents?|ev|charging|sessions?)\b"),
+    # Period-over-period comparisons usually mean CTEs / window functions
+    (3, "temporal comparison", r"\bvs\.?\b|versus|compar|previous|prior|growth|month[- ]over[- ]month|\bmom\b"
+                               r"|increas|decreas|declin|chang|trend"),
+    # Relative conditions against averages / ratios need subqueries
+    (2, "relative condition", r"\babove\b|\bbelow\b|average|\bavg\b|underperform|outperform|ratio|share"
+                              r"|percent|%|\bper\b|correlat"),
+    (1, "station attributes + operations (join)", r"\bregion|city|cities|state|highway|semi[- ]urban|station type"),
+    (1, "multiple metrics", r"\band\b.*\b(revenue|volume|footfall|incidents|downtime|stock)\b"),
+]
+_COMPILED_SIGNALS = [(w, reason, re.compile(p)) for w, reason, p in COMPLEXITY_SIGNALS]
+# Prompt rule 12: forecasts / dates outside Jul–Dec 2025 are correctly refused with sql=null
+_FORECAST = re.compile(r"\b(forecast|predict|projections?|projected|extrapolat\w*|will|expected|future"
+                       r"|next (week|month|quarter|year)|20(?!25)\d\d)\b")
+_FOLLOWUP = re.compile(r"\b(same|that|those|these|them|it|break (that|it) down|instead|also)\b")
+
+
+def references_context(question: str) -> bool:
+    """True if the question leans on earlier turns ("same for East", "break that down")."""
+    return bool(_FOLLOWUP.search((question or "").lower()))
+
+
+def score_complexity(question: str, conversation_history: list = None) -> dict:
+    """
+    Score how hard a question is to translate to SQL.
+    Returns {"score": int, "reasons": [str]}.
+    """
+    q = (question or "").lower()
+    score, reasons = 0, []
+    for weight, reason, pattern in _COMPILED_SIGNALS:
+        if pattern.search(q):
+            score += weight
+            reasons.append(reason)
+    if conversation_history and references_context(q):
+        score += 1
+        reasons.append("follow-up relies on conversation context")
+    if len(q.split()) > 20:
+        score += 1
+        reasons.append("long question")
+    return {"score": score, "reasons": reasons}
+
+
+def route_question(question: str, conversation_history: list = None) -> dict:
+    """
+    Pick a model tier for a question.
+    Returns {"tier": "fast" | "strong", "model": str, "score": int, "reasons": [str]}.
+    """
+    complexity = score_complexity(question, conversation_history)
+    tier = "fast" if complexity["score"] < ESCALATE_SCORE else "strong"
+    return {
+        "tier": tier,
+        "model": FAST_MODEL if tier == "fast" else STRONG_MODEL,
+        **complexity,
+    }
+
+
+def generate_routed(question: str, conversation_history: list = None) -> dict:
+    """
+    generate_sql on the routed model, with routing_tier / complexity_score in the metadata.
+    Used for live and speculative (prefetch) questions alike, so both show up per tier.
+    """
+    route = route_question(question, conversation_history)
+    gen = generate_sql(question, conversation_history, model=route["model"])
+    gen["metadata"]["routing_tier"] = route["tier"]
+    gen["metadata"]["complexity_score"] = route["score"]
+    return gen
+
+
+def is_forecast_question(question: str) -> bool:
+    """True for questions the prompt tells Claude to refuse (forecasts, dates outside the data)."""
+    return bool(_FORECAST.search((question or "").lower()))
+
+
+def needs_escalation(gen: dict, result: dict = None, question: str = None) -> str:
+    """
+    Return the reason an answer should be retried on the strong model, or "" if
+    it's fine. Applies to anything not already from STRONG_MODEL — the fast tier
+    and SQL served from the verified-answer store. A fast-tier refusal (sql=null)
+    is escalated too, unless the question is a forecast the prompt says to refuse.
+    """
+    meta = gen.get("metadata", {})
+    if meta.get("model") == STRONG_MODEL:
+        return ""
+    if gen["error"]:
+        return gen["error"]
+    if meta.get("parse_mode") == "failed":
+        return "Unparseable model response"
+    if gen["sql"] is None and not is_forecast_question(question):
+        return "Fast model declined to answer"
+    if result is not None and result.get("error"):
+        return result["error"]
+    return ""
@@ -0,0 +1,165 @@
+"""
+Speculative prefetch of likely next questions.
+Mines session sequences from query_logs into a first-order next-question model,
+then generates + executes the top-k likely follow-ups in the background while the
+user reads the current answer. Results land in a per-session SQL/result cache,
+bounded by a speculative token budget, with hit-rate reporting.
+"""
+
+import re
+import json
+import hashlib
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+TOP_K = 2                       # follow-ups to speculate on after each answer
+MIN_TRANSITION_COUNT = 2        # ignore transitions seen fewer times than this
+SESSION_TOKEN_BUDGET = 20_000   # max LLM tokens spent on speculation per session
+MAX_WORKERS = 2
+INFLIGHT_WAIT_SECONDS = 30      # how long a lookup waits for a speculation already running
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation, collapse whitespace — so button clicks and retyped questions match."""
+    q = re.sub(r"[^\w\s]", " ", (question or "").lower())
+    return re.sub(r"\s+", " ", q).strip()
+
+
+def build_next_question_model(rows: list) -> dict:
+    """
+    Build {normalized question: Counter(next normalized question -> count)} from
+    query_logs rows ordered by insertion. Also keeps the most common original
+    phrasing of each question under "_text" so predictions can be sent to Claude.
+    """
+    transitions = defaultdict(Counter)
+    phrasings = defaultdict(Counter)
+    last_by_session = {}
+
+    for row in rows:
+        question = row.get("user_question")
+        if not question:
+            continue
+        norm = normalize_question(question)
+        phrasings[norm][question.strip()] += 1
+        prev = last_by_session.get(row.get("session_id"))
+        if prev and prev != norm:
+            transitions[prev][norm] += 1
+        last_by_session[row.get("session_id")] = norm
+
+    return {
+        "transitions": {q: c for q, c in transitions.items()},
+        "_text": {q: c.most_common(1)[0][0] for q, c in phrasings.items()},
+    }
+
+
+def predict_next(model: dict, question: str, k: int = TOP_K) -> list:
+    """Top-k likely next questions (original phrasing) after `question`."""
+    counts = model.get("transitions", {}).get(normalize_question(question))
+    if not counts:
+        return []
+    return [model["_text"][q] for q, n in counts.most_common(k) if n >= MIN_TRANSITION_COUNT]
+
+
+def history_key(conversation_history: list) -> str:
+    """Fingerprint of the history build_prompt would send (last 5 turns)."""
+    recent = (conversation_history or [])[-5:]
+    payload = json.dumps([[t.get("question"), t.get("sql"), t.get("summary")] for t in recent], default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class Prefetcher:
+    """
+    Per-session speculative cache. generate_fn / execute_fn are model_router.generate_routed and
+    execute_query — passed in so the background threads never touch Streamlit state.
+    model_fn returns the next-question model; it is called on the first schedule()
+    so building a session doesn't hit query_logs before first paint.
+    usage_fn(metadata) is called for every speculative LLM call, hit or miss.
+    """
+
+    def __init__(self, model_fn, generate_fn, execute_fn, token_budget: int = SESSION_TOKEN_BUDGET, usage_fn=None):
+        self.model_fn = model_fn
+        self.model = None
+        self.generate_fn = generate_fn
+        self.execute_fn = execute_fn
+        self.usage_fn = usage_fn
+        self.token_budget = token_budget
+        self._executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._inflight = {}
+        self._stats = {"lookups": 0, "hits": 0, "speculated": 0, "tokens_spent": 0, "skipped_budget": 0}
+
+    def _key(self, question: str, conversation_history: list) -> tuple:
+        return normalize_question(question), history_key(conversation_history)
+
+    def schedule(self, question: str, conversation_history: list) -> list:
+        """Speculate on the likely follow-ups to `question`. Returns the questions queued."""
+        if self.model is None:
+            self.model = self.model_fn()
+        history = [dict(t) for t in (conversation_history or [])]
+        queued = []
+        for candidate in predict_next(self.model, question):
+            key = self._key(candidate, history)
+            with self._lock:
+                if key in self._cache or key in self._inflight:
+                    continue
+                if self._stats["tokens_spent"] >= self.token_budget:
+                    self._stats["skipped_budget"] += 1
+                    continue
+                self._inflight[key] = self._executor.submit(self._speculate, key, candidate, history)
+            queued.append(candidate)
+        return queued
+
+    def _speculate(self, key: tuple, question: str, history: list):
+        try:
+            gen = self.generate_fn(question, history)
+            gen.get("metadata", {})["speculative"] = True
+            if self.usage_fn is not None:
+                self.usage_fn(gen.get("metadata"))
+            tokens = gen.get("metadata", {}).get("total_tokens", 0)
+            result = None
+            if not gen["error"] and gen["sql"]:
+                result = self.execute_fn(gen["sql"])
+            with self._lock:
+                self._stats["speculated"] += 1
+                self._stats["tokens_spent"] += tokens
+                if not gen["error"] and (result is None or not result["error"]):
+                    self._cache[key] = {"gen": gen, "result": result}
+        except Exception as e:
+            print(f"Warning: Prefetch failed for '{question}': {e}")
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def lookup(self, question: str, conversation_history: list):
+        """
+        Return a prefetched {"gen", "result"} for this question + history, or None.
+        Waits briefly if the same speculation is still running.
+        """
+        key = self._key(question, conversation_history)
+        with self._lock:
+            self._stats["lookups"] += 1
+            future = self._inflight.get(key)
+        if future is not None:
+            try:
+                future.result(timeout=INFLIGHT_WAIT_SECONDS)
+            except Exception:
+                pass
+        with self._lock:
+            entry = self._cache.pop(key, None)
+            if entry:
+                self._stats["hits"] += 1
+        return entry
+
+    def stats(self) -> dict:
+        """Hit-rate and spend report for the sidebar."""
+        with self._lock:
+            s = dict(self._stats)
+        s["hit_rate"] = s["hits"] / s["lookups"] if s["lookups"] else 0.0
+        s["precision"] = s["hits"] / s["speculated"] if s["speculated"] else 0.0
+        s["token_budget"] = self.token_budget
+        return s
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -3,7 +3,7 @@ NL→SQL system prompt for fuel station operations analytics.
 This is the most critical file — SQL generation quality depends on this prompt.
 """
 
-SYSTEM_PROMPT = """You are a SQL query generator for Jbp's fuel station operations analytics system.
+_BASE_PROMPT = """You are a SQL query generator for Jbp's fuel station operations analytics system.
 
 You have access to a PostgreSQL database with the following tables:
 
@@ -57,7 +57,10 @@ RULES:
 11. LIMIT results to 20 rows unless the user asks for more or the query is an aggregation returning few rows.
 12. Do NOT attempt to extrapolate, forecast, or predict future values. If the user asks for projections or data outside the available date range (2025-07-01 to 2025-12-31), respond with sql: null and explain that forecasting is not possible from the database alone.
 
-RESPOND IN THIS EXACT JSON FORMAT (no markdown, no code fences, just raw JSON):
+"""
+
+# Legacy free-text mode: Claude writes the JSON itself
+JSON_OUTPUT_FORMAT = """RESPOND IN THIS EXACT JSON FORMAT (no markdown, no code fences, just raw JSON):
 {
   "sql": "SELECT ...",
   "explanation": "One-line plain English explanation of what this query does",
@@ -71,7 +74,19 @@ If the question cannot be answered:
   "assumptions": []
 }
 
---- FEW-SHOT EXAMPLES ---
+"""
+
+# Structured mode: the answer is the input of a forced tool call (see llm_response.SQL_TOOL)
+TOOL_OUTPUT_FORMAT = """ANSWER BY CALLING THE submit_sql_answer TOOL with:
+- sql: the PostgreSQL SELECT query, or null if the question cannot be answered
+- explanation: one-line plain English explanation of what the query does (or why it can't be answered)
+- assumptions: list of assumptions made to interpret the question (empty list if none)
+
+The examples below show the tool input to send for each question.
+
+"""
+
+_FEW_SHOT_EXAMPLES = """--- FEW-SHOT EXAMPLES ---
 
 User: "Which region has the highest diesel sales this quarter?"
 {
@@ -102,6 +117,9 @@ User: "How many safety incidents in Maharashtra last 3 months?"
 }
 """
 
+SYSTEM_PROMPT = _BASE_PROMPT + JSON_OUTPUT_FORMAT + _FEW_SHOT_EXAMPLES
+TOOL_SYSTEM_PROMPT = _BASE_PROMPT + TOOL_OUTPUT_FORMAT + _FEW_SHOT_EXAMPLES
+
 
 def build_prompt(user_question: str, conversation_history: list = None) -> list:
     """
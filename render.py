@@ -0,0 +1,121 @@
+"""
+Result rendering that adapts to result shape and size.
+A render payload is built once per message (downsampled chart data, a bounded
+preview, pre-converted to Arrow) and stored on the message, so reruns re-send
+small cached payloads instead of re-serialising every historical DataFrame.
+The full table is only sent when the user asks for it.
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from result_analytics import profile_result, time_sort_key
+
+SMALL_ROWS = 200          # at or below this, show the table as-is
+PREVIEW_ROWS = 50         # rows shown for larger results before "load all"
+MAX_PREVIEW_COLS = 12     # wider results are previewed with the first N columns
+MAX_POINTS = 300          # time-series points per series sent to the chart
+MAX_SERIES = 10           # more labels than this → top MAX_SERIES - 1 lines plus "Other"
+
+
+def _to_arrow(df: pd.DataFrame):
+    """Convert once up front; st.dataframe then skips the pandas→Arrow step on every rerun."""
+    try:
+        import pyarrow as pa  # ships with streamlit
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except Exception:
+        return df
+
+
+def downsample(series_df: pd.DataFrame, max_points: int = MAX_POINTS) -> pd.DataFrame:
+    """
+    Bucket-mean downsampling of a time-indexed frame (vectorised).
+    Keeps the first timestamp of each bucket as its index.
+    """
+    n = len(series_df)
+    if n <= max_points:
+        return series_df
+    buckets = (np.arange(n) * max_points) // n
+    out = series_df.groupby(buckets).mean(numeric_only=True)
+    out.index = pd.Index(series_df.index.to_series().groupby(buckets).first().values, name=series_df.index.name)
+    return out
+
+
+def _chart_frame(data: pd.DataFrame, time_col, label, metric, additive: bool = True):
+    """
+    Pivot a trend result into a time-indexed frame with one column per series.
+    Returns (chart, note) — note describes any series folded into "Other".
+    Rates / averages are averaged rather than summed when rows are combined.
+    """
+    times = time_sort_key(data[time_col])
+    ordered = times is not None
+    if not ordered:
+        times = data[time_col].astype(str)  # unparseable labels — keep the SQL's row order
+    frame = data.assign(_t=times)
+    agg = "sum" if additive else "mean"
+    note = None
+    if label is None:
+        chart = frame.groupby("_t", sort=ordered)[[metric]].agg(agg)
+    else:
+        series = frame[label].astype(str)
+        n_series = series.nunique()
+        if n_series > MAX_SERIES:
+            top = frame.groupby(series)[metric].agg(agg).nlargest(MAX_SERIES - 1).index
+            series = series.where(series.isin(top), "Other")
+            note = (f"Top {MAX_SERIES - 1} of {n_series} {label} by {'total' if additive else 'average'} {metric}; "
+                    f"the remaining {n_series - (MAX_SERIES - 1)} are combined as Other "
+                    f"({'summed' if additive else 'averaged'}).")
+        chart = frame.assign(_series=series).pivot_table(index="_t", columns="_series", values=metric, aggfunc=agg,
+                                                         sort=ordered)
+        if note:
+            chart = chart[[c for c in top if c in chart.columns] + ["Other"]]
+        chart.columns.name = str(label)
+    if ordered:
+        chart = chart.sort_index()
+    chart.index.name = str(time_col)
+    return downsample(chart), note
+
+
+def build_render_payload(df: pd.DataFrame) -> dict:
+    """
+    Pick a representation for a result and precompute everything it needs: a chart for
+    trends, a bounded preview + numeric summary for large / wide results.
+    """
+    prof = profile_result(df)
+    data, metric, label, time_col = prof["df"], prof["metric"], prof["label"], prof["time"]
+    rows, cols = data.shape
+    payload = {"rows": rows, "cols": cols, "chart": None, "chart_note": None, "summary": None, "truncated": False}
+
+    if time_col is not None and metric is not None and data[time_col].nunique() > 2:
+        payload["chart"], payload["chart_note"] = _chart_frame(data, time_col, label, metric, prof["additive"])
+
+    preview = data
+    if rows > SMALL_ROWS:
+        preview = preview.head(PREVIEW_ROWS)
+        payload["truncated"] = True
+        if prof["numeric"]:
+            payload["summary"] = _to_arrow(data[prof["numeric"]].describe().T.reset_index(names="column"))
+    if cols > MAX_PREVIEW_COLS:
+        preview = preview.iloc[:, :MAX_PREVIEW_COLS]
+        payload["truncated"] = True
+    payload["preview"] = _to_arrow(preview)
+    payload["preview_shape"] = preview.shape
+    return payload
+
+
+def render_result(df: pd.DataFrame, payload: dict, key: str):
+    """Draw a result from its cached payload. The full DataFrame is only sent on request."""
+    if payload["chart"] is not None:
+        st.line_chart(payload["chart"])
+        if payload.get("chart_note"):
+            st.caption(payload["chart_note"])
+
+    with st.expander(f"📊 View Data ({payload['rows']} rows)"):
+        st.dataframe(payload["preview"], use_container_width=True)
+        if payload["truncated"]:
+            shown_rows, shown_cols = payload["preview_shape"]
+            st.caption(f"Showing {shown_rows} of {payload['rows']} rows, {shown_cols} of {payload['cols']} columns.")
+            if payload["summary"] is not None:
+                st.dataframe(payload["summary"], use_container_width=True)
+            if st.toggle("Load full table", key=f"full_{key}"):
+                st.dataframe(df, use_container_width=True)
@@ -0,0 +1,326 @@
+"""
+Local result analytics — summarises a query result without a second LLM call.
+Computes vectorised stats over the result DataFrame (top/bottom, totals, deltas,
+MoM change, outliers), builds a narrative answer + compact history summary,
+and answers trivial follow-ups ("what's the total?") from the cached result.
+"""
+
+import re
+import warnings
+import pandas as pd
+
+# Column-name tokens that usually mark the time axis of a trend query
+# (matched per "_"-separated token, so days_with_incidents is not a time column)
+TIME_COLUMN_HINTS = {"month", "date", "day", "week", "quarter", "year", "period"}
+
+# Tokens marking rates / percentages / averages — never summed, and only used as
+# the metric when the result has no additive column
+DERIVED_COLUMN_HINTS = {"pct", "percent", "percentage", "rate", "ratio", "growth", "change", "share", "delta",
+                        "diff", "mom", "yoy", "avg", "average", "mean", "median", "rank", "per"}
+
+# Tokens of additive, total-style columns — preferred as the metric
+ADDITIVE_COLUMN_HINTS = {"total", "sum", "count", "volume", "revenue", "sales", "liters", "litres", "inr",
+                         "footfall", "incidents", "sessions", "hours", "stock", "amount", "quantity", "qty"}
+
+# Nouns in "which X is highest" / "how many X" that don't name an entity
+GENERIC_NOUNS = {"one", "row", "result", "item", "entry"}
+
+# |z-score| above this is reported as an outlier (only for 5+ rows)
+OUTLIER_Z = 2.0
+MIN_ROWS_FOR_OUTLIERS = 5
+
+# Follow-ups answerable from the previous result. Patterns are anchored so a
+# question carrying new filters ("total diesel in East?") still goes to Claude.
+_REF = r"(?:\s+(?:of\s+)?(?:that|this|these|those|them|it|all|the\s+above|above))?"
+FOLLOWUP_PATTERNS = [
+    ("total", rf"^(?:what(?:'s| is| was)\s+)?(?:the\s+)?(?:total|sum|grand total|overall total){_REF}$"),
+    ("total", rf"^(?:add|sum)\s+(?:them|it|these|those)\s+up$"),
+    ("max", rf"^(?:which|who|what)(?:\s+(?P<noun>\w+))?\s+(?:is|was|has|had)\s+(?:the\s+)?(?:highest|top|max|maximum|most|best|largest|biggest){_REF}$"),
+    ("max", rf"^(?:the\s+)?(?:highest|top|max|maximum|best|largest|biggest)(?:\s+one)?{_REF}$"),
+    ("min", rf"^(?:which|who|what)(?:\s+(?P<noun>\w+))?\s+(?:is|was|has|had)\s+(?:the\s+)?(?:lowest|bottom|min|minimum|least|worst|smallest){_REF}$"),
+    ("min", rf"^(?:the\s+)?(?:lowest|bottom|min|minimum|worst|smallest)(?:\s+one)?{_REF}$"),
+    ("mean", rf"^(?:what(?:'s| is| was)\s+)?(?:the\s+)?(?:average|avg|mean){_REF}$"),
+    ("count", rf"^how many(?:\s+(?P<noun>rows|results|items|entries|stations|regions|states|cities|months|days))?"
+              rf"(?:\s+(?:are there|were there|in total))?{_REF}$"),
+]
+_COMPILED_FOLLOWUPS = [(intent, re.compile(p)) for intent, p in FOLLOWUP_PATTERNS]
+
+
+def _fmt(value) -> str:
+    """Human-friendly number formatting for narratives."""
+    if value is None or pd.isna(value):
+        return "n/a"
+    if isinstance(value, (int, float)) or hasattr(value, "dtype"):
+        v = float(value)
+        if v.is_integer():
+            return f"{int(v):,}"
+        return f"{v:,.2f}"
+    return str(value)
+
+
+def _name_tokens(col) -> set:
+    return {t for t in re.split(r"[^a-z0-9]+", str(col).lower()) if t}
+
+
+def _singular(word: str) -> str:
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def is_derived_column(col) -> bool:
+    """True for rate / percentage / average columns, which must not be summed."""
+    return bool(_name_tokens(col) & DERIVED_COLUMN_HINTS)
+
+
+def _coerce_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Supabase returns NUMERIC columns as JSON numbers or strings depending on the RPC.
+    Convert object columns that are fully numeric; leave everything else untouched.
+    """
+    out = df.copy()
+    for col in out.columns:
+        if pd.api.types.is_object_dtype(out[col]) or pd.api.types.is_string_dtype(out[col]):
+            converted = pd.to_numeric(out[col], errors="coerce")
+            if converted.notna().sum() == out[col].notna().sum() and converted.notna().any():
+                out[col] = converted
+    return out
+
+
+def time_sort_key(values: pd.Series):
+    """
+    Chronologically sortable form of a time column: numeric / datetime columns as-is,
+    text ("Jul 2025", "2025-07") parsed as dates. None if the text doesn't parse —
+    callers then keep the SQL's row order rather than sorting alphabetically.
+    """
+    if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)  # "could not infer format" for e.g. 'Jul 2025'
+        parsed = pd.to_datetime(values, errors="coerce")
+    return parsed if parsed.notna().mean() >= 0.9 else None
+
+
+def profile_result(df: pd.DataFrame) -> dict:
+    """
+    Identify the roles of the result columns.
+    Returns {"df", "metric", "additive", "label", "time", "numeric"} — df is the coerced frame.
+    metric = last total-style numeric column (aggregates usually come last in the SELECT),
+    falling back to other non-derived, then derived (rate / % / avg) columns;
+    additive = whether the metric can be summed across rows.
+    time = first column whose name looks temporal, label = first other text column.
+    """
+    df = _coerce_numeric(df)
+    time_col = None
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]) or _name_tokens(col) & TIME_COLUMN_HINTS:
+            time_col = col
+            break
+
+    numeric = [c for c in df.columns if c != time_col and pd.api.types.is_numeric_dtype(df[c])
+               and not pd.api.types.is_bool_dtype(df[c])]
+    base = [c for c in numeric if not is_derived_column(c)]
+    preferred = [c for c in base if _name_tokens(c) & ADDITIVE_COLUMN_HINTS]
+    candidates = preferred or base or numeric
+    metric = candidates[-1] if candidates else None
+    label = next((c for c in df.columns if c not in numeric and c != time_col), None)
+
+    return {"df": df, "metric": metric, "additive": metric in base, "label": label, "time": time_col,
+            "numeric": numeric}
+
+
+def _row_name(row: pd.Series, label, time_col) -> str:
+    if label is not None:
+        return str(row[label])
+    if time_col is not None:
+        return str(row[time_col])
+    return f"row {row.name + 1}" if pd.api.types.is_integer(row.name) else str(row.name)
+
+
+def compute_stats(df: pd.DataFrame) -> dict:
+    """
+    Vectorised summary statistics over the metric column.
+    Returns a flat dict; keys are omitted when they don't apply to the result shape.
+    """
+    prof = profile_result(df)
+    data, metric, label, time_col = prof["df"], prof["metric"], prof["label"], prof["time"]
+    stats = {"rows": len(data), "columns": [str(c) for c in data.columns],
+             "metric": metric, "label": label, "time": time_col}
+    if metric is None or data.empty:
+        return stats
+
+    values = data[metric]
+    if prof["additive"]:
+        stats["total"] = float(values.sum())  # rates / averages are never summed
+    stats["mean"] = float(values.mean())
+
+    if len(data) > 1 and values.notna().any():
+        top, bottom = data.loc[values.idxmax()], data.loc[values.idxmin()]
+        stats["top"] = {"name": _row_name(top, label, time_col), "value": float(top[metric])}
+        stats["bottom"] = {"name": _row_name(bottom, label, time_col), "value": float(bottom[metric])}
+        if stats.get("total"):
+            stats["top"]["share_pct"] = round(100.0 * stats["top"]["value"] / stats["total"], 1)
+
+    # Period-over-period deltas for trend results
+    if time_col is not None and len(data) > 1:
+        key = time_sort_key(data[time_col])
+        ordered = data if key is None else data.iloc[key.argsort(kind="stable")]
+        if label is None:
+            series = ordered[metric]
+            stats["first"] = {"period": str(ordered[time_col].iloc[0]), "value": float(series.iloc[0])}
+            stats["last"] = {"period": str(ordered[time_col].iloc[-1]), "value": float(series.iloc[-1])}
+            stats["delta"] = stats["last"]["value"] - float(series.iloc[-2])
+            prev = float(series.iloc[-2])
+            stats["mom_change_pct"] = round(100.0 * stats["delta"] / prev, 1) if prev else None
+            stats["previous_period"] = str(ordered[time_col].iloc[-2])
+        else:
+            # Per-series change between the last two periods; report the biggest mover
+            pct = ordered.groupby(label, sort=False)[metric].pct_change()
+            last_idx = ordered.groupby(label, sort=False).tail(1).index
+            movers = pct.loc[last_idx].dropna()
+            if not movers.empty:
+                mover_idx = movers.abs().idxmax()
+                stats["biggest_mover"] = {"name": str(ordered.loc[mover_idx, label]),
+                                          "change_pct": round(100.0 * float(movers.loc[mover_idx]), 1)}
+
+    if len(data) >= MIN_ROWS_FOR_OUTLIERS:
+        std = values.std()
+        if std and not pd.isna(std):
+            z = (values - values.mean()) / std
+            flagged = data.loc[z.abs() > OUTLIER_Z]
+            stats["outliers"] = [{"name": _row_name(r, label, time_col), "value": float(r[metric])}
+                                 for _, r in flagged.iterrows()]
+
+    return stats
+
+
+def build_narrative(stats: dict) -> str:
+    """Turn compute_stats output into a short plain-English answer."""
+    metric = stats.get("metric")
+    if metric is None or stats["rows"] == 0:
+        return f"{stats['rows']} rows returned."
+
+    if stats["rows"] == 1:
+        return f"Result: {metric} = {_fmt(stats['mean'])}."
+    if not stats.get("top"):
+        return f"{stats['rows']} rows returned."
+
+    parts = []
+    if stats.get("last") and stats.get("label") is None:
+        parts.append(f"{metric} went from {_fmt(stats['first']['value'])} ({stats['first']['period']}) "
+                     f"to {_fmt(stats['last']['value'])} ({stats['last']['period']}).")
+        if stats.get("mom_change_pct") is not None:
+            parts.append(f"Latest change vs {stats['previous_period']}: {stats['mom_change_pct']:+.1f}%.")
+        parts.append(f"Peak was {stats['top']['name']} at {_fmt(stats['top']['value'])}.")
+    else:
+        if "total" in stats:
+            parts.append(f"Across {stats['rows']} rows, total {metric} is {_fmt(stats['total'])}.")
+        else:
+            parts.append(f"Across {stats['rows']} rows, average {metric} is {_fmt(stats['mean'])}.")
+        top = stats["top"]
+        share = f" ({top['share_pct']}% of total)" if top.get("share_pct") is not None else ""
+        parts.append(f"{top['name']} is highest at {_fmt(top['value'])}{share}; "
+                     f"{stats['bottom']['name']} is lowest at {_fmt(stats['bottom']['value'])}.")
+        if stats.get("biggest_mover"):
+            m = stats["biggest_mover"]
+            parts.append(f"Biggest latest-period change: {m['name']} ({m['change_pct']:+.1f}%).")
+
+    if stats.get("outliers"):
+        names = ", ".join(o["name"] for o in stats["outliers"][:3])
+        parts.append(f"Outliers: {names}.")
+    return " ".join(parts)
+
+
+def build_history_summary(stats: dict) -> str:
+    """Compact one-line summary for conversation_history (goes into every follow-up prompt)."""
+    summary = f"{stats['rows']} rows. Columns: {stats['columns']}."
+    metric = stats.get("metric")
+    if metric is None or stats["rows"] == 0:
+        return summary
+    if "total" in stats:
+        summary += f" {metric}: total={_fmt(stats['total'])}, mean={_fmt(stats['mean'])}"
+    else:
+        summary += f" {metric}: mean={_fmt(stats['mean'])}"
+    if stats.get("top"):
+        summary += f", max={stats['top']['name']} ({_fmt(stats['top']['value'])})"
+        summary += f", min={stats['bottom']['name']} ({_fmt(stats['bottom']['value'])})"
+    if stats.get("mom_change_pct") is not None:
+        summary += f", last change={stats['mom_change_pct']:+.1f}%"
+    return summary + "."
+
+
+def summarise_result(df: pd.DataFrame) -> dict:
+    """
+    Summarise a query result locally.
+    Returns {"narrative": str, "summary": str, "stats": dict}.
+    """
+    stats = compute_stats(df)
+    return {
+        "narrative": build_narrative(stats),
+        "summary": build_history_summary(stats),
+        "stats": stats,
+    }
+
+
+def _parse_followup(question: str):
+    """
+    (intent, noun) for trivial follow-ups, else (None, None). intent is "total" / "max" /
+    "min" / "mean" / "count"; noun is e.g. "region" in "which region is highest".
+    """
+    q = re.sub(r"[?!.]+$", "", question.strip().lower()).strip()
+    q = re.sub(r"\s+", " ", q)
+    for intent, pattern in _COMPILED_FOLLOWUPS:
+        m = pattern.match(q)
+        if m:
+            return intent, m.groupdict().get("noun")
+    return None, None
+
+
+def _noun_matches(noun: str, column) -> bool:
+    """True if a follow-up noun ("region", "station") names the given result column."""
+    return column is not None and noun in {_singular(t) for t in _name_tokens(column)}
+
+
+def answer_followup(question: str, df: pd.DataFrame):
+    """
+    Answer a trivial follow-up from the previous result DataFrame.
+    Returns the answer string, or None if the question needs a fresh SQL query.
+    """
+    if df is None or df.empty:
+        return None
+    intent, noun = _parse_followup(question)
+    if intent is None:
+        return None
+    entity = _singular(noun) if noun else None
+    entity = None if entity in GENERIC_NOUNS else entity
+
+    if intent == "count":
+        if entity is None:
+            return f"The previous result has {len(df)} rows."
+        # "how many stations" only makes sense if the result is per station
+        column = next((c for c in df.columns if _noun_matches(entity, c)), None)
+        if column is None:
+            return None
+        return f"The previous result covers {df[column].nunique()} distinct {noun}."
+
+    stats = compute_stats(df)
+    metric = stats.get("metric")
+    if metric is None:
+        return None
+    # "which region is highest" after a per-station result needs a fresh query
+    if entity is not None and not _noun_matches(entity, stats["label"] if stats["label"] is not None else stats["time"]):
+        return None
+
+    if intent == "total":
+        if "total" not in stats:
+            return None  # summing rates / averages would be wrong — let Claude handle it
+        return f"Total {metric} across the {stats['rows']} rows above: {_fmt(stats['total'])}."
+    if intent == "mean":
+        return f"Average {metric} across the {stats['rows']} rows above: {_fmt(stats['mean'])}."
+    if stats["rows"] == 1:
+        return None  # "which is highest?" over a single row isn't meaningful — let Claude handle it
+    key = "top" if intent == "max" else "bottom"
+    word = "highest" if intent == "max" else "lowest"
+    return f"{stats[key]['name']} has the {word} {metric}: {_fmt(stats[key]['value'])}."
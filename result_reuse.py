@@ -0,0 +1,372 @@
+"""
+Result-set reuse engine — evaluates follow-up queries over cached prior results.
+Follow-ups like "same for East" or "only diesel" usually produce SQL that is a
+filter, projection or re-aggregation of a result already in the session. When the
+new query can be derived exactly from a cached superset, it is computed locally
+over the in-memory DataFrame instead of hitting Supabase and rescanning daily_operations.
+
+Only plain single-SELECT queries are considered (no CTEs, subqueries, DISTINCT,
+HAVING, OR or window functions) — anything else falls through to the database.
+"""
+
+import re
+import pandas as pd
+
+# How many recent results to keep in the lineage for reuse lookups
+MAX_LINEAGE = 10
+
+# Aggregates that can be rebuilt from a finer-grained aggregate of the same kind
+REAGGREGATE = {"sum": "sum", "min": "min", "max": "max", "count": "sum"}
+
+_UNSUPPORTED = re.compile(r"\b(with|distinct|having|union|intersect|except|over|case|or|between|not|like|ilike|is)\b")
+_STATEMENT = re.compile(
+    r"^select (?P<select>.+?) from (?P<from>.+?)"
+    r"(?: where (?P<where>.+?))?"
+    r"(?: group by (?P<group>.+?))?"
+    r"(?: order by (?P<order>.+?))?"
+    r"(?: limit (?P<limit>\d+))?$"
+)
+_COLUMN = re.compile(r"^[a-z_][a-z0-9_]*(?:\.[a-z_][a-z0-9_]*)?$")
+_AGGREGATE = re.compile(r"^(sum|min|max|count|avg)\((\*|[a-z_][a-z0-9_]*(?:\.[a-z_][a-z0-9_]*)?)\)$")
+_SELECT_ITEM = re.compile(r"^(?P<expr>.+?)(?:\s+(?:as\s+)?(?P<alias>[a-z_][a-z0-9_]*))?$")
+_PREDICATE = re.compile(r"^(?P<col>[a-z_][a-z0-9_.]*)\s*(?P<op><=|>=|<>|!=|=|<|>)\s*(?P<value>\S+)$")
+_IN_PREDICATE = re.compile(r"^(?P<col>[a-z_][a-z0-9_.]*)\s+in\s*\((?P<values>[^()]+)\)$")
+_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+
+def _mask_literals(sql: str):
+    """Swap string literals for placeholders so keyword matching can't fire inside them."""
+    literals = []
+
+    def repl(m):
+        literals.append(m.group(0)[1:-1].replace("''", "'"))
+        return f"'#{len(literals) - 1}'"
+
+    return _LITERAL.sub(repl, sql), literals
+
+
+def _unmask(text: str, literals: list) -> str:
+    """Put the real literals back into masked clause text (for comparisons)."""
+    return re.sub(r"'#(\d+)'", lambda m: "'" + literals[int(m.group(1))].replace("'", "''") + "'", text)
+
+
+def _predicate_key(text: str, pred: dict, literals: list):
+    """
+    Identity of a WHERE conjunct, built from the real literal values — masked text
+    alone would make fs.region = 'East' and fs.region = 'West' look identical.
+    """
+    if pred is None:
+        return ("text", _unmask(text, literals))
+    value = frozenset(pred["value"]) if pred["op"] == "in" else pred["value"]
+    return (pred["col"], pred["op"], value)
+
+
+def _split_top_level(text: str, sep: str = ",") -> list:
+    """Split on sep outside parentheses."""
+    parts, depth, current = [], 0, []
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == sep and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+    parts.append("".join(current).strip())
+    return [p for p in parts if p]
+
+
+def _bare(col: str) -> str:
+    return col.split(".")[-1]
+
+
+def _parse_value(token: str, literals: list):
+    m = re.fullmatch(r"'#(\d+)'", token)
+    if m:
+        return literals[int(m.group(1))]
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+def _parse_predicate(text: str, literals: list):
+    m = _IN_PREDICATE.match(text)
+    if m:
+        values = [_parse_value(v.strip(), literals) for v in m.group("values").split(",")]
+        if any(v is None for v in values):
+            return None
+        return {"col": m.group("col"), "op": "in", "value": values}
+    m = _PREDICATE.match(text)
+    if m:
+        value = _parse_value(m.group("value"), literals)
+        if value is None:
+            return None
+        op = "!=" if m.group("op") == "<>" else m.group("op")
+        return {"col": m.group("col"), "op": op, "value": value}
+    return None
+
+
+def parse_sql(sql: str):
+    """
+    Parse a simple SELECT into its clauses.
+    Returns a dict, or None if the query shape isn't supported for reuse.
+    """
+    if not sql:
+        return None
+    masked, literals = _mask_literals(sql.strip().rstrip(";"))
+    text = re.sub(r"\s+", " ", masked).strip().lower()
+    text = re.sub(r"\(\s+", "(", re.sub(r"\s+\)", ")", text))
+    if text.count("select") != 1 or _UNSUPPORTED.search(text):
+        return None
+    m = _STATEMENT.match(text)
+    if not m:
+        return None
+
+    select = []
+    for item in _split_top_level(m.group("select")):
+        im = _SELECT_ITEM.match(item)
+        expr, alias = im.group("expr").strip(), im.group("alias")
+        agg = _AGGREGATE.match(expr)
+        if agg:
+            select.append({"kind": "agg", "func": agg.group(1), "arg": agg.group(2),
+                           "expr": expr, "name": alias or agg.group(1)})
+        elif _COLUMN.match(expr):
+            select.append({"kind": "col", "expr": expr, "name": alias or _bare(expr)})
+        else:
+            return None
+
+    where = []
+    if m.group("where"):
+        for conjunct in re.split(r" and ", m.group("where")):
+            pred = _parse_predicate(conjunct.strip(), literals)
+            where.append({"key": _predicate_key(conjunct.strip(), pred, literals), "pred": pred})
+
+    group = _split_top_level(m.group("group")) if m.group("group") else []
+    if any(not _COLUMN.match(g) for g in group):
+        return None
+
+    order = []
+    if m.group("order"):
+        for item in _split_top_level(m.group("order")):
+            om = re.match(r"^(?P<expr>.+?)(?:\s+(?P<dir>asc|desc))?$", item)
+            order.append({"expr": om.group("expr"), "ascending": om.group("dir") != "desc"})
+
+    return {
+        "select": select,
+        "from": _unmask(m.group("from"), literals),
+        "where": where,
+        "group": group,
+        "order": order,
+        "limit": int(m.group("limit")) if m.group("limit") else None,
+        "aggregated": bool(group) or any(s["kind"] == "agg" for s in select),
+    }
+
+
+def _output_for(parsed: dict, expr: str):
+    """Output column name in a cached result for a column/aggregate expression."""
+    for item in parsed["select"]:
+        if item["expr"] == expr:
+            return item["name"]
+    if _COLUMN.match(expr):
+        matches = [i["name"] for i in parsed["select"] if i["kind"] == "col" and _bare(i["expr"]) == _bare(expr)]
+        if len(matches) == 1:
+            return matches[0]
+    return None
+
+
+def _is_complete(entry: dict) -> bool:
+    """A LIMITed result is still a full superset if it returned fewer rows than the limit."""
+    limit = entry["parsed"]["limit"]
+    return limit is None or len(entry["dataframe"]) < limit
+
+
+def plan_reuse(new: dict, cached: dict):
+    """
+    Decide whether `new` can be computed from the cached result of `cached`.
+    Returns a plan dict (filters, mode, columns) or None.
+    """
+    if new["from"] != cached["from"]:
+        return None
+    cached_where = {w["key"] for w in cached["where"]}
+    new_where = {w["key"] for w in new["where"]}
+    if not cached_where <= new_where:
+        return None
+
+    # Extra predicates must be evaluable on the cached output, and — for aggregated
+    # results — only on group-by columns, otherwise they'd change the aggregates.
+    filterable = cached["group"] if cached["aggregated"] else [i["expr"] for i in cached["select"]]
+    filters = []
+    for w in new["where"]:
+        if w["key"] in cached_where:
+            continue
+        pred = w["pred"]
+        if pred is None:
+            return None
+        target = next((g for g in filterable if g == pred["col"] or _bare(g) == _bare(pred["col"])), None)
+        column = _output_for(cached, target) if target else None
+        if column is None:
+            return None
+        filters.append({**pred, "column": column})
+
+    same_grain = set(new["group"]) == set(cached["group"])
+    if cached["aggregated"] and not set(new["group"]) <= set(cached["group"]):
+        return None
+    if new["aggregated"] and not cached["aggregated"]:
+        mode = "aggregate"
+    elif not new["aggregated"]:
+        if cached["aggregated"]:
+            return None
+        mode = "project"
+    else:
+        mode = "project" if same_grain else "reaggregate"
+
+    columns = []
+    for item in new["select"]:
+        if item["kind"] == "col":
+            if new["aggregated"] and item["expr"] not in new["group"]:
+                return None
+            source = _output_for(cached, item["expr"])
+            if source is None:
+                return None
+            columns.append({"name": item["name"], "source": source, "func": None})
+            continue
+
+        if mode == "aggregate":
+            if item["arg"] == "*":
+                source, func = None, "size"
+            else:
+                source, func = _output_for(cached, item["arg"]), item["func"]
+                func = "mean" if func == "avg" else func
+                if source is None:
+                    return None
+        else:
+            source = _output_for(cached, item["expr"])
+            if source is None:
+                return None
+            if mode == "project":
+                func = None
+            elif item["func"] in REAGGREGATE:
+                func = REAGGREGATE[item["func"]]
+            else:
+                return None  # AVG over a coarser grain can't be rebuilt from per-group averages
+        columns.append({"name": item["name"], "source": source, "func": func})
+
+    group_outputs = [_output_for(cached, g) for g in new["group"]]
+    if any(g is None for g in group_outputs):
+        return None
+    return {"mode": mode, "filters": filters, "columns": columns, "group": group_outputs}
+
+
+def _apply_filter(df: pd.DataFrame, f: dict) -> pd.Series:
+    col = df[f["column"]]
+    values = f["value"] if f["op"] == "in" else [f["value"]]
+    if all(isinstance(v, float) for v in values):
+        col = pd.to_numeric(col, errors="coerce")
+    else:
+        col = col.astype(str)
+        values = [str(v) for v in values]
+    if f["op"] == "in":
+        return col.isin(values)
+    v = values[0]
+    return {"=": col == v, "!=": col != v, "<": col < v, "<=": col <= v, ">": col > v, ">=": col >= v}[f["op"]]
+
+
+def evaluate_plan(plan: dict, new: dict, df: pd.DataFrame) -> pd.DataFrame:
+    """Run a reuse plan over a cached result DataFrame (vectorised)."""
+    if plan["filters"]:
+        mask = pd.Series(True, index=df.index)
+        for f in plan["filters"]:
+            mask &= _apply_filter(df, f)
+        df = df[mask]
+
+    if plan["mode"] != "project":
+        sources = {c["source"] for c in plan["columns"] if c["func"] not in (None, "size")}
+        df = df.assign(**{src: pd.to_numeric(df[src], errors="coerce") for src in sources})
+
+    if plan["mode"] == "project":
+        out = pd.DataFrame({c["name"]: df[c["source"]].values for c in plan["columns"]})
+    else:
+        aggs = [c for c in plan["columns"] if c["func"]]
+        if plan["group"]:
+            grouped = df.groupby(plan["group"], sort=False, dropna=False)
+            agg_frame = pd.DataFrame({
+                c["name"]: grouped.size() if c["func"] == "size"
+                else grouped[c["source"]].agg(c["func"])
+                for c in aggs
+            }).reset_index()
+        else:
+            agg_frame = pd.DataFrame([{
+                c["name"]: len(df) if c["func"] == "size" else df[c["source"]].agg(c["func"])
+                for c in aggs
+            }])
+        out = pd.DataFrame({
+            c["name"]: agg_frame[c["source"]] if c["func"] is None else agg_frame[c["name"]]
+            for c in plan["columns"]
+        })
+
+    if new["order"]:
+        keys, ascending = [], []
+        for o in new["order"]:
+            name = next((i["name"] for i in new["select"] if o["expr"] in (i["expr"], i["name"])), None)
+            if name is None:
+                raise ValueError(f"ORDER BY {o['expr']} is not in the select list")
+            keys.append(name)
+            ascending.append(o["ascending"])
+        out = out.sort_values(keys, ascending=ascending, kind="stable")
+    if new["limit"] is not None:
+        out = out.head(new["limit"])
+    return out.reset_index(drop=True)
+
+
+def execute_with_reuse(sql: str, lineage: list):
+    """
+    Try to answer `sql` from cached results in the lineage (newest first).
+    Returns an execute_query-shaped dict with an extra "reused_from" key, or None
+    if no cached result can serve it (caller then runs the query on Supabase).
+    """
+    new = parse_sql(sql)
+    if new is None:
+        return None
+    for entry in reversed(lineage):
+        cached = entry["parsed"]
+        if cached is None or not _is_complete(entry):
+            continue
+        plan = plan_reuse(new, cached)
+        if plan is None:
+            continue
+        try:
+            out = evaluate_plan(plan, new, entry["dataframe"])
+        except Exception as e:
+            print(f"Warning: Result reuse failed, falling back to DB: {e}")
+            return None
+        return {"data": out.to_dict("records"), "error": None, "reused_from": entry["id"]}
+    return None
+
+
+def record_result(lineage: list, sql: str, df: pd.DataFrame, parent: int = None) -> int:
+    """
+    Add a result to the lineage. parent = id of the entry it was derived from (None if from DB).
+    Returns the new entry id. Keeps only the last MAX_LINEAGE entries.
+    """
+    entry_id = (lineage[-1]["id"] + 1) if lineage else 0
+    lineage.append({
+        "id": entry_id,
+        "sql": sql,
+        "parsed": parse_sql(sql),
+        "dataframe": df,
+        "parent": parent,
+    })
+    del lineage[:-MAX_LINEAGE]
+    return entry_id
+
+
+def forget_result(lineage: list, sql: str):
+    """Drop every entry for `sql` (e.g. after a thumbs-down) and anything derived from it."""
+    dropped = {e["id"] for e in lineage if e["sql"] == sql}
+    for entry in lineage:
+        if entry["parent"] in dropped:
+            dropped.add(entry["id"])
+    lineage[:] = [e for e in lineage if e["id"] not in dropped]
@@ -5,45 +5,74 @@ Returns full metadata for logging (tokens, latency, raw response, etc.)
 """
 
 import os
-import json
 import time
-from dotenv import load_dotenv
-from anthropic import Anthropic
-from prompts import SYSTEM_PROMPT, build_prompt
+from prompts import SYSTEM_PROMPT, TOOL_SYSTEM_PROMPT, build_prompt
+from llm_response import SQL_TOOL, TOOL_CHOICE, parse_response, parse_failure_rate
 
-load_dotenv()
-
-client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 MODEL = "claude-sonnet-4-20250514"
 
+# Force a tool call with a JSON schema so the answer arrives pre-parsed.
+# Set False to fall back to the legacy free-text JSON response.
+STRUCTURED_OUTPUT = True
+
+_client = None
+
+
+def get_client():
+    """Lazily constructed Anthropic client — the SDK import and .env load happen on the first call."""
+    global _client
+    if _client is None:
+        from dotenv import load_dotenv
+        from anthropic import Anthropic
+
+        load_dotenv()
+        _client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    return _client
 
-def generate_sql(user_question: str, conversation_history: list = None) -> dict:
+
+def set_client(client):
+    """Swap the client (e.g. the eval harness's record/replay client). Pass None to reset."""
+    global _client
+    _client = client
+
+
+def generate_sql(user_question: str, conversation_history: list = None, model: str = None) -> dict:
     """
     Send user question to Claude API, get back SQL + explanation + full metadata.
+    model overrides the default MODEL (used by model_router for the fast tier).
     Returns dict with keys: sql, explanation, assumptions, error, metadata
     """
     messages = build_prompt(user_question, conversation_history)
+    model = model or MODEL
+    system_prompt = TOOL_SYSTEM_PROMPT if STRUCTURED_OUTPUT else SYSTEM_PROMPT
 
     metadata = {
-        "system_prompt": SYSTEM_PROMPT,
+        "system_prompt": system_prompt,
         "request_messages": messages,
         "raw_response": None,
-        "model": MODEL,
+        "model": model,
         "input_tokens": 0,
         "output_tokens": 0,
         "total_tokens": 0,
         "llm_latency_ms": 0,
         "stop_reason": None,
+        "parse_mode": None,
+        "parse_failure_rate": 0.0,
     }
 
+    request = {
+        "model": model,
+        "max_tokens": 1024,
+        "system": system_prompt,
+        "messages": messages,
+    }
+    if STRUCTURED_OUTPUT:
+        request["tools"] = [SQL_TOOL]
+        request["tool_choice"] = TOOL_CHOICE
+
     try:
         start = time.time()
-        response = client.messages.create(
-            model=MODEL,
-            max_tokens=1024,
-            system=SYSTEM_PROMPT,
-            messages=messages,
-        )
+        response = get_client().messages.create(**request)
         metadata["llm_latency_ms"] = int((time.time() - start) * 1000)
 
         # Capture token usage
@@ -52,37 +81,32 @@ def generate_sql(user_question: str, conversation_history: list = None) -> dict:
         metadata["total_tokens"] = response.usage.input_tokens + response.usage.output_tokens
         metadata["stop_reason"] = response.stop_reason
 
-        # Extract text from response
-        raw_text = response.content[0].text.strip()
-        metadata["raw_response"] = raw_text
-
-        # Parse JSON — handle cases where Claude wraps it in markdown code fences
-        clean_text = raw_text
-        if clean_text.startswith("```"):
-            clean_text = clean_text.split("```")[1]
-            if clean_text.startswith("json"):
-                clean_text = clean_text[4:]
-            clean_text = clean_text.strip()
+        # Tool input is already a dict; text responses go through the tolerant parser,
+        # which repairs malformed JSON locally instead of re-asking Claude
+        parsed = parse_response(response)
+        metadata["raw_response"] = parsed["raw_text"]
+        metadata["parse_mode"] = parsed["parse_mode"]
+        metadata["parse_failure_rate"] = round(parse_failure_rate(), 4)
 
-        result = json.loads(clean_text)
+        # A response cut off at max_tokens may carry a shortened but still valid-looking
+        # query (LIMIT 10 → LIMIT 1) — report it as an error so it's retried, never run
+        if response.stop_reason == "max_tokens":
+            return {
+                "sql": None,
+                "explanation": "",
+                "assumptions": [],
+                "error": "Claude response was truncated (max_tokens reached)",
+                "metadata": metadata,
+            }
 
         return {
-            "sql": result.get("sql"),
-            "explanation": result.get("explanation", ""),
-            "assumptions": result.get("assumptions", []),
+            "sql": parsed["sql"],
+            "explanation": parsed["explanation"],
+            "assumptions": parsed["assumptions"],
             "error": None,
             "metadata": metadata,
         }
 
-    except json.JSONDecodeError:
-        # Claude responded conversationally instead of JSON — treat as non-SQL answer
-        return {
-            "sql": None,
-            "explanation": raw_text[:500],
-            "assumptions": [],
-            "error": None,
-            "metadata": metadata,
-        }
     except Exception as e:
         return {
             "sql": None,
@@ -111,3 +135,4 @@ if __name__ == "__main__":
     print(f"Total tokens: {m['total_tokens']}")
     print(f"LLM latency: {m['llm_latency_ms']}ms")
     print(f"Stop reason: {m['stop_reason']}")
+    print(f"Parse mode: {m['parse_mode']}")
@@ -0,0 +1,45 @@
+"""
+Regression tests for the tolerant response parser: a response cut off inside the
+"sql" value must never come back as runnable SQL.
+Run with: python -m pytest -q test_llm_response.py
+"""
+
+from types import SimpleNamespace
+from llm_response import parse_text, parse_response
+
+
+def _text_response(text):
+    return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)])
+
+
+def test_sql_truncated_mid_limit_fails():
+    parsed = parse_text('{"sql": "SELECT fs.region FROM fuel_stations fs ORDER BY r DESC LIMIT 1')
+    assert parsed["parse_mode"] == "failed"
+    assert parsed["sql"] is None
+
+
+def test_sql_truncated_mid_literal_fails():
+    parsed = parse_response(_text_response(
+        '```json\n{"sql": "SELECT * FROM daily_operations ops WHERE ops.revenue_inr > 100'))
+    assert parsed["parse_mode"] == "failed"
+    assert parsed["sql"] is None
+
+
+def test_truncated_before_sql_key_fails():
+    parsed = parse_text('{"explanation": "Sums diesel volume per reg')
+    assert parsed["parse_mode"] == "failed"
+    assert parsed["sql"] is None
+
+
+def test_truncated_after_complete_sql_is_repaired():
+    parsed = parse_text('{"sql": "SELECT 1", "explanation": "ok", "assumptions": ["Q4 = Oct-Dec')
+    assert parsed["parse_mode"] == "repaired"
+    assert parsed["sql"] == "SELECT 1"
+    assert parsed["assumptions"] == ["Q4 = Oct-Dec"]
+
+
+def test_trailing_comma_and_python_literals_are_repaired():
+    parsed = parse_text('Here you go:\n{"sql": None, "explanation": "Forecasting is not possible", "assumptions": [],}')
+    assert parsed["parse_mode"] == "repaired"
+    assert parsed["sql"] is None
+    assert parsed["explanation"] == "Forecasting is not possible"
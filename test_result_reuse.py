@@ -0,0 +1,76 @@
+"""
+Regression tests for the result-set reuse engine: follow-ups that only change a
+literal ("same for West", "only diesel") must never be served from the cached result.
+Run with: python -m pytest -q test_result_reuse.py
+"""
+
+import pandas as pd
+from result_reuse import execute_with_reuse, record_result
+
+FROM = "FROM daily_operations ops JOIN fuel_stations fs ON ops.station_id = fs.station_id"
+
+
+def _lineage(sql, rows):
+    lineage = []
+    record_result(lineage, sql, pd.DataFrame(rows))
+    return lineage
+
+
+def test_different_region_literal_is_not_reused():
+    lineage = _lineage(
+        f"SELECT fs.region, SUM(ops.revenue_inr) AS revenue {FROM} WHERE fs.region = 'East' GROUP BY fs.region",
+        [{"region": "East", "revenue": 100.0}],
+    )
+    sql = f"SELECT fs.region, SUM(ops.revenue_inr) AS revenue {FROM} WHERE fs.region = 'West' GROUP BY fs.region"
+    assert execute_with_reuse(sql, lineage) is None
+
+
+def test_different_fuel_literal_is_not_reused():
+    lineage = _lineage(
+        f"SELECT fs.region, SUM(ops.volume_sold_liters) AS volume {FROM} "
+        f"WHERE ops.fuel_type = 'Petrol' AND fs.status = 'Active' GROUP BY fs.region",
+        [{"region": "East", "volume": 10.0}, {"region": "West", "volume": 20.0}],
+    )
+    sql = (f"SELECT fs.region, SUM(ops.volume_sold_liters) AS volume {FROM} "
+           f"WHERE ops.fuel_type = 'Diesel' AND fs.status = 'Active' GROUP BY fs.region")
+    assert execute_with_reuse(sql, lineage) is None
+
+
+def test_different_numeric_threshold_is_not_reused():
+    cols = "SELECT ops.station_id, ops.operation_date, ops.revenue_inr FROM daily_operations ops"
+    lineage = _lineage(f"{cols} WHERE ops.revenue_inr > 100", [{"station_id": "S1", "operation_date": "2025-12-01",
+                                                                "revenue_inr": 500.0}])
+    assert execute_with_reuse(f"{cols} WHERE ops.revenue_inr > 1000", lineage) is None
+
+
+def test_different_join_literal_is_not_reused():
+    lineage = _lineage(
+        "SELECT fs.region, SUM(ops.revenue_inr) AS revenue FROM daily_operations ops JOIN fuel_stations fs "
+        "ON ops.station_id = fs.station_id AND fs.status = 'Active' GROUP BY fs.region",
+        [{"region": "East", "revenue": 100.0}],
+    )
+    sql = ("SELECT fs.region, SUM(ops.revenue_inr) AS revenue FROM daily_operations ops JOIN fuel_stations fs "
+           "ON ops.station_id = fs.station_id AND fs.status = 'Inactive' GROUP BY fs.region")
+    assert execute_with_reuse(sql, lineage) is None
+
+
+def test_narrowing_filter_on_group_column_is_reused():
+    lineage = _lineage(
+        f"SELECT fs.region, ops.fuel_type, SUM(ops.volume_sold_liters) AS volume {FROM} "
+        f"WHERE fs.status = 'Active' GROUP BY fs.region, ops.fuel_type",
+        [{"region": "East", "fuel_type": "Petrol", "volume": 10.0},
+         {"region": "East", "fuel_type": "Diesel", "volume": 30.0},
+         {"region": "West", "fuel_type": "Diesel", "volume": 20.0}],
+    )
+    sql = (f"SELECT fs.region, SUM(ops.volume_sold_liters) AS volume {FROM} "
+           f"WHERE fs.status = 'Active' AND ops.fuel_type = 'Diesel' GROUP BY fs.region ORDER BY volume DESC")
+    result = execute_with_reuse(sql, lineage)
+    assert result["reused_from"] == 0
+    assert result["data"] == [{"region": "East", "volume": 30.0}, {"region": "West", "volume": 20.0}]
+
+
+def test_same_literals_are_reused():
+    sql = f"SELECT fs.region, SUM(ops.revenue_inr) AS revenue {FROM} WHERE fs.region IN ('East', 'West') GROUP BY fs.region"
+    lineage = _lineage(sql, [{"region": "East", "revenue": 100.0}, {"region": "West", "revenue": 50.0}])
+    swapped = sql.replace("('East', 'West')", "('West', 'East')")
+    assert execute_with_reuse(swapped, lineage)["reused_from"] == 0
@@ -0,0 +1,64 @@
+"""
+Tests for the verified-answer store: only exact rephrasings replay a verified SQL,
+follow-ups and failed SQL never become verified answers, and the latest feedback wins.
+Run with: python -m pytest -q test_verified_answers.py
+"""
+
+from verified_answers import VerifiedAnswerStore, build_store
+
+TOP5_SQL = "SELECT fs.station_name, SUM(ops.revenue_inr) AS total_revenue FROM daily_operations ops ..."
+DIESEL_SQL = "SELECT fs.region, SUM(ops.volume_sold_liters) FROM daily_operations ops WHERE ops.fuel_type = 'Diesel' ..."
+
+
+def _store():
+    store = VerifiedAnswerStore()
+    store.add_verified("Top 5 stations by revenue last month", TOP5_SQL)
+    return store
+
+
+def test_rephrasing_matches():
+    store = _store()
+    assert store.lookup("Show me the top 5 stations by revenue last month?")["sql"] == TOP5_SQL
+    assert store.lookup("top 5 station by revenue for last month")["sql"] == TOP5_SQL
+
+
+def test_extra_filter_words_do_not_match():
+    store = _store()
+    for question in ["Top 5 stations by revenue last month in Mumbai",
+                     "Top 5 stations by revenue last month in Bengaluru",
+                     "Top 5 stations by revenue last month with convenience store",
+                     "Top 10 stations by revenue last month",
+                     "Top 5 regions by revenue last month"]:
+        assert store.lookup(question) is None, question
+
+
+def test_different_grouping_does_not_match():
+    store = VerifiedAnswerStore()
+    store.add_verified("Which region has the highest diesel sales this quarter for highway stations", DIESEL_SQL)
+    assert store.lookup("Which state has the highest diesel sales this quarter for highway stations") is None
+    assert store.lookup("Which station has the highest diesel sales this quarter for highway stations") is None
+
+
+def test_followups_and_failed_sql_are_not_seeded():
+    rows = [
+        {"user_question": "diesel only", "generated_sql": DIESEL_SQL, "user_feedback": "up",
+         "sql_valid": True, "standalone": False},
+        {"user_question": "Top 5 stations by revenue last month", "generated_sql": TOP5_SQL, "user_feedback": "up",
+         "sql_valid": False, "standalone": True},
+    ]
+    store = build_store(rows)
+    assert store.lookup("diesel only") is None
+    assert store.lookup("Top 5 stations by revenue last month") is None
+    assert len(store) == 0
+
+
+def test_quarantine_blocks_until_later_thumbs_up():
+    store = _store()
+    store.record_feedback("Top 5 stations by revenue last month", TOP5_SQL, "down")
+    assert store.lookup("Top 5 stations by revenue last month") is None
+    assert store.is_quarantined(TOP5_SQL.lower())
+    store.add_verified("Top 5 stations by revenue last month", TOP5_SQL)
+    assert store.lookup("Top 5 stations by revenue last month") is None
+    store.record_feedback("Top 5 stations by revenue last month", TOP5_SQL, "up")
+    assert not store.is_quarantined(TOP5_SQL)
+    assert store.lookup("Top 5 stations by revenue last month")["sql"] == TOP5_SQL
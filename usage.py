@@ -0,0 +1,210 @@
+"""
+Token + cost accounting with budget enforcement.
+Aggregates tokens, cost, LLM latency and cache savings per session, per day and
+per model into a small local SQLite store, keeps an incrementally-updated rolling
+window for the sidebar, and enforces per-session / global daily budgets.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from collections import deque
+from datetime import date
+
+# USD per 1M tokens (input, output)
+MODEL_PRICING = {
+    "claude-sonnet-4-20250514": (3.0, 15.0),
+    "claude-3-5-haiku-20241022": (0.8, 4.0),
+}
+DEFAULT_PRICING = (3.0, 15.0)
+USD_TO_INR = 86.0  # approx
+
+SESSION_BUDGET_INR = float(os.getenv("SESSION_BUDGET_INR", "25"))
+DAILY_BUDGET_INR = float(os.getenv("DAILY_BUDGET_INR", "500"))
+
+USAGE_DB_PATH = os.getenv("USAGE_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "usage.db"))
+ROLLING_WINDOW_SECONDS = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage_rollup (
+    scope TEXT NOT NULL,            -- 'session' or 'day'
+    key TEXT NOT NULL,              -- session_id or ISO date
+    model TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    cache_hits INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    saved_usd REAL NOT NULL DEFAULT 0,
+    llm_latency_ms INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, key, model)
+)
+"""
+_UPSERT = """
+INSERT INTO usage_rollup (scope, key, model, calls, cache_hits, input_tokens, output_tokens, cost_usd, saved_usd, llm_latency_ms)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (scope, key, model) DO UPDATE SET
+    calls = calls + excluded.calls,
+    cache_hits = cache_hits + excluded.cache_hits,
+    input_tokens = input_tokens + excluded.input_tokens,
+    output_tokens = output_tokens + excluded.output_tokens,
+    cost_usd = cost_usd + excluded.cost_usd,
+    saved_usd = saved_usd + excluded.saved_usd,
+    llm_latency_ms = llm_latency_ms + excluded.llm_latency_ms
+"""
+
+_db_lock = threading.Lock()
+_initialised = False
+
+
+def _connect() -> sqlite3.Connection:
+    global _initialised
+    conn = sqlite3.connect(USAGE_DB_PATH, timeout=5)
+    if not _initialised:
+        conn.execute(_SCHEMA)
+        _initialised = True
+    return conn
+
+
+def estimate_cost_usd(model: str, input_tokens: int, output_tokens: int) -> float:
+    in_rate, out_rate = MODEL_PRICING.get(model, DEFAULT_PRICING)
+    return (input_tokens * in_rate + output_tokens * out_rate) / 1_000_000
+
+
+def estimate_cost_inr(metadata: dict) -> float:
+    """Cost of one generate_sql call, in INR, from its metadata."""
+    if not metadata:
+        return 0.0
+    usd = estimate_cost_usd(metadata.get("model"), metadata.get("input_tokens", 0), metadata.get("output_tokens", 0))
+    return usd * USD_TO_INR
+
+
+class RollingWindow:
+    """
+    Sliding-window totals updated incrementally on every add(): entries older than
+    the window are evicted from the left and subtracted from the running sums, so
+    stats() is O(1) and never re-reads the store.
+    """
+
+    def __init__(self, seconds: int = ROLLING_WINDOW_SECONDS):
+        self.seconds = seconds
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._sums = {"calls": 0, "cache_hits": 0, "tokens": 0, "cost_usd": 0.0, "saved_usd": 0.0, "latency_ms": 0}
+
+    def _evict(self, now: float):
+        while self._events and self._events[0][0] < now - self.seconds:
+            _, event = self._events.popleft()
+            for k, v in event.items():
+                self._sums[k] -= v
+
+    def add(self, event: dict, now: float = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._evict(now)
+            self._events.append((now, event))
+            for k, v in event.items():
+                self._sums[k] += v
+
+    def stats(self, now: float = None) -> dict:
+        now = time.time() if now is None else now
+        with self._lock:
+            self._evict(now)
+            s = dict(self._sums)
+        s["avg_latency_ms"] = int(s["latency_ms"] / s["calls"]) if s["calls"] else 0
+        s["cost_inr"] = s["cost_usd"] * USD_TO_INR
+        s["saved_inr"] = s["saved_usd"] * USD_TO_INR
+        return s
+
+
+# Process-wide window across all sessions (the sidebar shows the last hour)
+rolling = RollingWindow()
+
+
+def _average_call_cost_usd() -> float:
+    """Typical cost of one LLM call — used to value a cache hit. Falls back to a ~3k/300 token call."""
+    s = rolling.stats()
+    if s["calls"]:
+        return s["cost_usd"] / s["calls"]
+    return estimate_cost_usd(None, 3000, 300)
+
+
+def record_usage(session_id: str, metadata: dict = None, cached: bool = False):
+    """
+    Record one answered question or speculative call. cached=True means no LLM call was
+    made for it (local follow-up, verified answer); its saving is valued at the average call
+    cost. Prefetched answers are recorded by the Prefetcher when speculated, not when served.
+    Fails silently — accounting should never break the main flow.
+    """
+    metadata = metadata or {}
+    model = metadata.get("model") or "unknown"
+    input_t = 0 if cached else metadata.get("input_tokens", 0)
+    output_t = 0 if cached else metadata.get("output_tokens", 0)
+    latency = 0 if cached else metadata.get("llm_latency_ms", 0)
+    calls = 0 if cached or not (input_t or output_t) else 1
+    cost = estimate_cost_usd(model, input_t, output_t)
+    saved = _average_call_cost_usd() if cached else 0.0
+
+    rolling.add({"calls": calls, "cache_hits": int(cached), "tokens": input_t + output_t,
+                 "cost_usd": cost, "saved_usd": saved, "latency_ms": latency})
+    try:
+        with _db_lock:
+            conn = _connect()
+            with conn:
+                for scope, key in (("session", session_id), ("day", date.today().isoformat())):
+                    conn.execute(_UPSERT, (scope, key, model, calls, int(cached), input_t, output_t, cost, saved, latency))
+            conn.close()
+    except Exception as e:
+        print(f"Warning: Usage accounting failed: {e}")
+
+
+def get_totals(scope: str, key: str) -> dict:
+    """Totals for one session / day, summed over models."""
+    try:
+        with _db_lock:
+            conn = _connect()
+            row = conn.execute(
+                "SELECT COALESCE(SUM(calls), 0), COALESCE(SUM(cache_hits), 0), "
+                "COALESCE(SUM(input_tokens + output_tokens), 0), COALESCE(SUM(cost_usd), 0), "
+                "COALESCE(SUM(saved_usd), 0) FROM usage_rollup WHERE scope = ? AND key = ?",
+                (scope, key),
+            ).fetchone()
+            conn.close()
+    except Exception as e:
+        print(f"Warning: Usage lookup failed: {e}")
+        row = (0, 0, 0, 0.0, 0.0)
+    return {"calls": row[0], "cache_hits": row[1], "tokens": row[2],
+            "cost_inr": row[3] * USD_TO_INR, "saved_inr": row[4] * USD_TO_INR}
+
+
+def get_model_breakdown(scope: str, key: str) -> list:
+    """Per-model rows for one session / day."""
+    try:
+        with _db_lock:
+            conn = _connect()
+            rows = conn.execute(
+                "SELECT model, calls, input_tokens, output_tokens, cost_usd, llm_latency_ms "
+                "FROM usage_rollup WHERE scope = ? AND key = ? ORDER BY cost_usd DESC",
+                (scope, key),
+            ).fetchall()
+            conn.close()
+    except Exception as e:
+        print(f"Warning: Usage lookup failed: {e}")
+        return []
+    return [{"model": m, "calls": c, "input_tokens": i, "output_tokens": o, "cost_inr": usd * USD_TO_INR,
+             "avg_latency_ms": int(lat / c) if c else 0} for m, c, i, o, usd, lat in rows]
+
+
+def check_budget(session_id: str) -> dict:
+    """
+    Returns {"ok": bool, "reason": str}. When not ok, callers should serve cached /
+    templated answers only and refuse anything that needs a new LLM call.
+    """
+    session = get_totals("session", session_id)
+    if session["cost_inr"] >= SESSION_BUDGET_INR:
+        return {"ok": False, "reason": f"this conversation has used its ₹{SESSION_BUDGET_INR:.0f} budget"}
+    today = get_totals("day", date.today().isoformat())
+    if today["cost_inr"] >= DAILY_BUDGET_INR:
+        return {"ok": False, "reason": f"today's ₹{DAILY_BUDGET_INR:.0f} usage budget has been reached"}
+    return {"ok": True, "reason": ""}
@@ -0,0 +1,137 @@
+"""
+Verified-answer store built from user feedback.
+Thumbs-up (question, SQL) pairs asked as standalone questions are indexed by their
+content tokens, so a rephrasing of the same question ("top 5 stations by revenue last
+month?" vs "Show me the top 5 stations by revenue last month") replays the verified SQL
+instead of regenerating it. Any extra or different content word — a city, a filter, a
+grouping — means a different question, so matches are exact on content tokens.
+Thumbs-down SQL is quarantined: cached / templated paths must never serve it —
+until a later thumbs-up on the same SQL lifts it (the latest feedback wins).
+"""
+
+import re
+import json
+import threading
+from collections import defaultdict
+
+VERIFIED_MODEL = "verified"  # metadata["model"] marker for answers served from the store
+
+# Words that don't change what a question asks for; every other word must agree
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "by", "to", "and", "or", "with", "from", "at", "per",
+    "what", "which", "who", "how", "is", "are", "was", "were", "me", "show", "give", "list", "tell",
+    "get", "find", "do", "does", "did", "has", "have", "had", "i", "we", "our", "my", "please", "all",
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _stem(token: str) -> str:
+    return token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+
+
+def tokenize(question: str) -> frozenset:
+    return frozenset(_stem(t) for t in _TOKEN.findall((question or "").lower()) if t not in STOPWORDS)
+
+
+def normalize_sql(sql: str) -> str:
+    """Whitespace/case-insensitive key for quarantine checks (string literals kept as-is)."""
+    parts = re.split(r"('(?:[^']|'')*')", (sql or "").strip().rstrip(";"))
+    return "".join(p if p.startswith("'") else re.sub(r"\s+", " ", p).lower() for p in parts).strip()
+
+
+class VerifiedAnswerStore:
+    """
+    In-memory map of verified pairs keyed by the question's content-token set.
+    Thread-safe; one instance is shared across sessions via st.cache_resource.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}                  # token set -> {"question", "sql", "explanation", "assumptions"}
+        self._by_sql = defaultdict(set)     # normalized sql -> token sets verified with it
+        self._quarantined = set()           # normalized sql
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        for tokens in self._by_sql.pop(key, set()):
+            self._entries.pop(tokens, None)
+
+    def add_verified(self, question: str, sql: str, explanation: str = "", assumptions: list = None):
+        """Index a thumbs-up pair (ignored if the SQL is quarantined)."""
+        key = normalize_sql(sql)
+        tokens = tokenize(question)
+        if not key or not tokens:
+            return
+        with self._lock:
+            if key in self._quarantined:
+                return
+            previous = self._entries.get(tokens)
+            if previous is not None:
+                self._by_sql[normalize_sql(previous["sql"])].discard(tokens)
+            self._entries[tokens] = {
+                "question": question, "sql": sql,
+                "explanation": explanation or "", "assumptions": assumptions or [],
+            }
+            self._by_sql[key].add(tokens)
+
+    def quarantine(self, sql: str):
+        """Thumbs-down: drop the pair from the verified index and block its SQL everywhere."""
+        key = normalize_sql(sql)
+        if not key:
+            return
+        with self._lock:
+            self._quarantined.add(key)
+            self._remove(key)
+
+    def is_quarantined(self, sql: str) -> bool:
+        if not sql:
+            return False
+        with self._lock:
+            return normalize_sql(sql) in self._quarantined
+
+    def record_feedback(self, question: str, sql: str, feedback: str, explanation: str = "", assumptions: list = None):
+        """Apply one thumbs up/down. Feedback is applied in order, so the latest on a SQL wins."""
+        if feedback == "up":
+            with self._lock:
+                self._quarantined.discard(normalize_sql(sql))
+            self.add_verified(question, sql, explanation, assumptions)
+        elif feedback == "down":
+            self.quarantine(sql)
+
+    def lookup(self, question: str):
+        """
+        Verified answer for a question with exactly the same content tokens, or None.
+        Returns {"question", "sql", "explanation", "assumptions"}.
+        """
+        tokens = tokenize(question)
+        if not tokens:
+            return None
+        with self._lock:
+            entry = self._entries.get(tokens)
+            if entry is None:
+                return None
+            return {"question": entry["question"], "sql": entry["sql"], "explanation": entry["explanation"],
+                    "assumptions": list(entry["assumptions"])}
+
+
+def build_store(rows: list) -> VerifiedAnswerStore:
+    """
+    Build a store from query_logs feedback rows (oldest first), e.g. db.fetch_feedback_pairs().
+    Thumbs-up rows only become verified answers if the SQL ran and the question was standalone.
+    """
+    store = VerifiedAnswerStore()
+    for row in rows:
+        if row.get("user_feedback") == "up" and not (row.get("sql_valid") and row.get("standalone")):
+            continue
+        assumptions = row.get("assumptions") or []
+        if isinstance(assumptions, str):
+            try:
+                assumptions = json.loads(assumptions)
+            except json.JSONDecodeError:
+                assumptions = []
+        store.record_feedback(row.get("user_question"), row.get("generated_sql"), row.get("user_feedback"),
+                              row.get("explanation"), assumptions)
+    return store